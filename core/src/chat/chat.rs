@@ -179,6 +179,9 @@ pub struct UsageInfo {
     pub prompt_tokens: Option<u32>,
     pub completion_tokens: Option<u32>,
     pub total_tokens: Option<u32>,
+    /// Portion of `prompt_tokens` served from a provider-side prompt cache, if reported.
+    #[serde(default)]
+    pub cached_prompt_tokens: Option<u32>,
 }
 
 #[derive(Debug, Clone, PartialEq, Eq, Serialize, Deserialize)]
@@ -1,26 +1,36 @@
 
-use std::sync::Arc;
+use std::collections::VecDeque;
+use std::collections::HashMap;
+use std::hash::{DefaultHasher, Hash, Hasher};
+use std::sync::{Arc, RwLock};
+use std::time::Duration;
 
 use base64::Engine;
 use markhor_core::chat::ChatError;
 use markhor_core::chat::chat::{
     ChatApi, ChatOptions, ChatResponse, ChatStream, ContentPart, FinishReason,
-    Message, ModelInfo, ToolCallRequest, ToolChoice, ToolParameterSchema,
+    Message, ModelInfo, StreamChunk, ToolCallRequest, ToolChoice, ToolParameterSchema,
     UsageInfo,
 };
 use async_trait::async_trait;
+use futures::{Stream, StreamExt};
 use markhor_core::extension::Extension;
-use reqwest::{Client, StatusCode};
+use reqwest::Client;
 use serde::{Deserialize, Serialize};
 use serde_json::json;
 use tracing::{debug, error, instrument, trace, warn};
+use url::Url;
 use uuid::Uuid;
-use secrecy::ExposeSecret;
 
 use crate::gemini::error::map_response_error;
 
+use super::context_cache::{ContextCache, EXPIRY_MARGIN};
 use super::error::GeminiError;
+use super::response_cache::{request_key, ResponseCache};
 use super::shared::{GeminiConfig, SharedGeminiClient, EXTENSION_URI};
+use super::single_flight::{Flight, InFlightRequests};
+use super::sse::SseDecoder;
+use super::tokens::{approximate_text_tokens, estimate_text_tokens, IMAGE_TOKENS};
 
 
 
@@ -42,6 +52,98 @@ struct GeminiGenerateRequest {
     #[serde(skip_serializing_if = "Option::is_none")]
     generation_config: Option<GeminiGenerationConfig>,
     // safety_settings: Option<Vec<GeminiSafetySetting>>, // Add if needed
+    #[serde(skip_serializing_if = "Option::is_none")]
+    cached_content: Option<String>, // Name of a cachedContents resource holding the prefix
+}
+
+impl GeminiGenerateRequest {
+    /// Computes context cache keys for the conversation prefix (all contents but the last).
+    ///
+    /// Element `i` identifies the prefix ending with content `i`: it hashes the model,
+    /// system instruction, tools and the contents up to `i`, so that a cache created for an
+    /// earlier turn can be found again. Returns `None` if the prefix cannot be serialized.
+    fn prefix_keys(&self, model_id: &str) -> Option<Vec<u64>> {
+        let prefix_len = self.contents.len().saturating_sub(1);
+        let mut hasher = DefaultHasher::new();
+        model_id.hash(&mut hasher);
+        let header = serde_json::to_vec(&(&self.system_instruction, &self.tools, &self.tool_config));
+        match header {
+            Ok(bytes) => bytes.hash(&mut hasher),
+            Err(e) => {
+                warn!(error = %e, "Failed to serialize request prefix for context caching");
+                return None;
+            }
+        };
+        let mut keys = Vec::with_capacity(prefix_len);
+        for content in &self.contents[..prefix_len] {
+            match serde_json::to_vec(content) {
+                Ok(bytes) => bytes.hash(&mut hasher),
+                Err(e) => {
+                    warn!(error = %e, "Failed to serialize request prefix for context caching");
+                    return None;
+                }
+            }
+            keys.push(hasher.finish());
+        }
+        Some(keys)
+    }
+
+    /// Cheaply approximates the prompt tokens of the request's system instruction and
+    /// contents, for use on the request path (e.g. rate limiting).
+    fn estimated_tokens(&self) -> usize {
+        self.system_instruction.iter()
+            .chain(&self.contents)
+            .map(|content| content.estimated_tokens(approximate_text_tokens))
+            .sum()
+    }
+}
+
+/// Request body for creating a `cachedContents` resource.
+#[derive(Serialize, Debug)]
+#[serde(rename_all = "camelCase")]
+struct GeminiCreateCachedContentRequest<'a> {
+    model: String, // Format: "models/{model_id}"
+    contents: &'a [GeminiContent],
+    #[serde(skip_serializing_if = "Option::is_none")]
+    system_instruction: Option<&'a GeminiContent>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    tools: Option<&'a Vec<GeminiTool>>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    tool_config: Option<&'a GeminiToolConfig>,
+    ttl: String, // Duration in seconds, e.g. "300s"
+}
+
+#[derive(Deserialize, Debug)]
+struct GeminiCachedContent {
+    name: String, // Format: "cachedContents/{id}"
+}
+
+/// Request body for submitting a batch job (`batchGenerateContent`).
+#[derive(Serialize, Debug)]
+struct GeminiBatchGenerateRequest {
+    batch: GeminiBatchSpec,
+}
+
+#[derive(Serialize, Debug)]
+#[serde(rename_all = "camelCase")]
+struct GeminiBatchSpec {
+    display_name: String,
+    input_config: GeminiBatchInputConfig,
+}
+
+#[derive(Serialize, Debug)]
+struct GeminiBatchInputConfig {
+    requests: GeminiInlinedRequests,
+}
+
+#[derive(Serialize, Debug)]
+struct GeminiInlinedRequests {
+    requests: Vec<GeminiInlinedRequest>,
+}
+
+#[derive(Serialize, Debug)]
+struct GeminiInlinedRequest {
+    request: GeminiGenerateRequest,
 }
 
 #[derive(Serialize, Deserialize, Debug, Clone)]
@@ -51,43 +153,60 @@ struct GeminiContent {
     parts: Vec<GeminiPart>,
 }
 
-impl From<Message> for GeminiContent {
-    fn from(message: Message) -> Self {
+impl GeminiContent {
+    /// Estimates the tokens of this content locally, counting text with `count_text`.
+    fn estimated_tokens(&self, count_text: fn(&str) -> usize) -> usize {
+        self.parts.iter().map(|part| part.estimated_tokens(count_text)).sum()
+    }
+}
+
+/// Joins the text parts of a message, ignoring non-text parts.
+fn join_text_parts(parts: &[ContentPart]) -> String {
+    // Common case of a plain text message: copy the text without collecting parts first
+    if let [ContentPart::Text(text)] = parts {
+        return text.clone();
+    }
+    parts.iter()
+        .filter_map(|part| match part {
+            ContentPart::Text(text) => Some(text.as_str()),
+            _ => None,
+        })
+        .collect::<Vec<_>>()
+        .join("\n")
+}
+
+// Converts from borrowed messages, so only text is copied and image data is
+// base64-encoded straight from the caller's buffer.
+impl From<&Message> for GeminiContent {
+    fn from(message: &Message) -> Self {
         match message {
             Message::System(parts) => {
                 // We only handle text system prompts for now
-                let combined_text = parts.into_iter()
-                    .filter_map(|p| p.into_text())
-                    .collect::<Vec<_>>()
-                    .join("\n");
-
                 GeminiContent {
                     role: "system".to_string(), // Role is ignored by API but struct needs it
-                    parts: vec![GeminiPart::Text{ text: combined_text }]
+                    parts: vec![GeminiPart::Text{ text: join_text_parts(parts) }]
                 }
             }
             Message::User(parts) => {
-                let gemini_parts = parts.into_iter().map(|p| p.into()).collect();
                 GeminiContent { 
                     role: "user".to_string(), 
-                    parts: gemini_parts 
+                    parts: parts.iter().map(GeminiPart::from).collect(),
                 }
             }
             Message::Assistant { content: parts, tool_calls } => {
-                // Convert standard content parts (Text, Image)
-                let mut gemini_parts: Vec<_> = parts.into_iter().map(|p| p.into()).collect();
-
-                // Convert requested tool calls into Gemini FunctionCall parts
-                for call_request in tool_calls {
-                    gemini_parts.push(GeminiPart::FunctionCall {
+                // Convert standard content parts (Text, Image), then requested tool calls
+                // into Gemini FunctionCall parts
+                let gemini_parts = parts.iter()
+                    .map(GeminiPart::from)
+                    .chain(tool_calls.iter().map(|call_request| GeminiPart::FunctionCall {
                         function_call: GeminiFunctionCall {
                             // The 'name' here is the function the assistant *wants* to call
-                            name: call_request.name,
-                            // 'args' is the structured JSON arguments - directly use the value
-                            args: call_request.arguments,
+                            name: call_request.name.clone(),
+                            // 'args' is the structured JSON arguments
+                            args: call_request.arguments.clone(),
                         }
-                    });
-                }
+                    }))
+                    .collect();
 
                 GeminiContent {
                     role: "model".to_string(), // Assistant role maps to "model"
@@ -96,15 +215,14 @@ impl From<Message> for GeminiContent {
             }
             Message::Tool(tool_results) => {
                 // Each ToolResult needs to be converted into a FunctionResponse part
-                let function_response_parts: Vec<GeminiPart> = tool_results.into_iter()
-                    .map(|result| {
-                        GeminiPart::FunctionResponse {
-                            function_response: GeminiFunctionResponse {
-                                name: result.name,
-                                response: result.content,
-                            }
+                let function_response_parts = tool_results.iter()
+                    .map(|result| GeminiPart::FunctionResponse {
+                        function_response: GeminiFunctionResponse {
+                            name: result.name.clone(),
+                            response: result.content.clone(),
                         }
-                    }).collect();
+                    })
+                    .collect();
 
                 GeminiContent {
                     role: "function".to_string(), // Role for providing tool results back (Todo: verify)
@@ -118,6 +236,7 @@ impl From<Message> for GeminiContent {
 #[derive(Serialize, Deserialize, Debug, Clone)]
 //#[serde(rename_all = "camelCase")] // No longer needed, but harmless
 #[serde(untagged)] // Allows parts to be text OR function call OR function response etc.
+#[serde(try_from = "GeminiRawPart")] // Deserialize in one pass instead of trying each variant
 enum GeminiPart {
     // Todo: consider using tuple instead of struct members
     Text {
@@ -137,18 +256,69 @@ enum GeminiPart {
     // FileData{ file_data: GeminiFileData } // For file uploads if needed
 }
 
-impl From<ContentPart> for GeminiPart {
-    fn from(part: ContentPart) -> Self {
+/// Wire format of a part with every kind of payload optional.
+///
+/// Decoding into this struct takes a single pass over the input, whereas an untagged enum
+/// buffers each part and then attempts every variant in turn.
+#[derive(Deserialize)]
+#[serde(rename_all = "camelCase")]
+struct GeminiRawPart {
+    #[serde(default)]
+    text: Option<String>,
+    #[serde(default, alias = "inline_data")]
+    inline_data: Option<GeminiBlob>,
+    #[serde(default)]
+    function_call: Option<GeminiFunctionCall>,
+    #[serde(default)]
+    function_response: Option<GeminiFunctionResponse>,
+}
+
+impl TryFrom<GeminiRawPart> for GeminiPart {
+    type Error = String;
+
+    fn try_from(raw: GeminiRawPart) -> Result<Self, Self::Error> {
+        if let Some(text) = raw.text {
+            Ok(GeminiPart::Text { text })
+        } else if let Some(inline_data) = raw.inline_data {
+            Ok(GeminiPart::InlineData { inline_data })
+        } else if let Some(function_call) = raw.function_call {
+            Ok(GeminiPart::FunctionCall { function_call })
+        } else if let Some(function_response) = raw.function_response {
+            Ok(GeminiPart::FunctionResponse { function_response })
+        } else {
+            Err("unsupported content part: expected text, inlineData, functionCall or functionResponse".to_string())
+        }
+    }
+}
+
+impl GeminiPart {
+    /// Estimates the tokens of this part locally, counting text with `count_text`.
+    fn estimated_tokens(&self, count_text: fn(&str) -> usize) -> usize {
+        match self {
+            GeminiPart::Text { text } => count_text(text),
+            GeminiPart::InlineData { .. } => IMAGE_TOKENS,
+            GeminiPart::FunctionCall { function_call } => {
+                count_text(&function_call.name) + count_text(&function_call.args.to_string())
+            }
+            GeminiPart::FunctionResponse { function_response } => {
+                count_text(&function_response.name) + count_text(&function_response.response.to_string())
+            }
+        }
+    }
+}
+
+impl From<&ContentPart> for GeminiPart {
+    fn from(part: &ContentPart) -> Self {
         match part {
             ContentPart::Text(text) => {
-                GeminiPart::Text { text }
+                GeminiPart::Text { text: text.clone() }
             }
             ContentPart::Image { mime_type, data } => {
                 // Base64 encode data for inlineData
                 let encoded_data = base64::engine::general_purpose::STANDARD.encode(data);
                 GeminiPart::InlineData {
                     inline_data: GeminiBlob {
-                        mime_type: mime_type,
+                        mime_type: mime_type.clone(),
                         data: encoded_data,
                     }
                 }
@@ -234,7 +404,7 @@ impl From<ToolChoice> for GeminiFunctionCallingMode {
             ToolChoice::Required => GeminiFunctionCallingMode::Any,
             ToolChoice::None => GeminiFunctionCallingMode::None,
             ToolChoice::Tool { name } => {
-                warn!("Forcing use of a specific tool is not supported for Gemini (tool: '{}'). Using ANY", name);
+                warn!(tool = %name, "Forcing use of a specific tool is not supported for Gemini. Using ANY");
                 GeminiFunctionCallingMode::Any
             },
         }
@@ -258,6 +428,28 @@ struct GeminiGenerationConfig {
     // response_mime_type: Option<String> // e.g., "application/json" for JSON mode
 }
 
+impl GeminiGenerationConfig {
+    /// Builds the generation config from chat options.
+    /// Returns `None` if no generation option is set, so the field can be omitted entirely.
+    fn from_options(options: &ChatOptions) -> Option<Self> {
+        if options.temperature.is_none()
+            && options.top_p.is_none()
+            && options.max_tokens.is_none()
+            && options.stop_sequences.is_none()
+        {
+            return None;
+        }
+        Some(Self {
+            temperature: options.temperature,
+            top_p: options.top_p,
+            max_output_tokens: options.max_tokens,
+            stop_sequences: options.stop_sequences.clone(),
+            candidate_count: Some(1), // Usually want just one candidate for chat
+            // response_mime_type: options.response_format // Map if/when needed
+        })
+    }
+}
+
 // --- Response Structs ---
 // 
 // https://cloud.google.com/vertex-ai/generative-ai/docs/model-reference/inference#response
@@ -269,6 +461,17 @@ struct GeminiGenerateResponse {
     // prompt_feedback: Option<GeminiPromptFeedback>, // Add if needed for safety ratings etc.
     #[serde(default)]
     usage_metadata: Option<GeminiUsageMetadata>,
+    #[serde(default)]
+    error: Option<GeminiStatus>, // Only sent in place of a chunk when a stream fails midway
+}
+
+/// `google.rpc.Status`, as embedded in error payloads.
+#[derive(Deserialize, Debug)]
+struct GeminiStatus {
+    #[serde(default)]
+    code: i32,
+    #[serde(default)]
+    message: String,
 }
 
 impl GeminiGenerateResponse {
@@ -298,7 +501,7 @@ impl GeminiGenerateResponse {
                                 // Handle potential base64 decoding error
                                 let decoded_data = base64::engine::general_purpose::STANDARD.decode(inline_data.data)
                                     .map_err(|e| {
-                                        error!("Failed to decode base64 image data from Gemini response: {}", e);
+                                        error!(error = %e, "Failed to decode base64 image data from Gemini response");
                                         GeminiError::UnexpectedResponse(format!("Failed to decode base64 image data: {}", e))
                                     })?;
                                 content_parts.push(ContentPart::Image {
@@ -329,7 +532,7 @@ impl GeminiGenerateResponse {
             }
 
             if content_parts.is_empty() && tool_calls.is_empty() {
-                debug!("Received response with no text content or tool calls (Finish Reason: {:?}).", finish_reason);
+                debug!(?finish_reason, "Received response with no text content or tool calls.");
                 // This might be normal (e.g., safety filter, stop sequence).
             }
 
@@ -411,6 +614,8 @@ struct GeminiUsageMetadata {
     candidates_token_count: Option<u32>, // Sum of tokens for all candidates
     #[serde(default)]
     total_token_count: Option<u32>,
+    #[serde(default)]
+    cached_content_token_count: Option<u32>, // Part of the prompt served from cachedContent
 }
 
 impl Into<UsageInfo> for GeminiUsageMetadata {
@@ -419,42 +624,129 @@ impl Into<UsageInfo> for GeminiUsageMetadata {
             prompt_tokens: self.prompt_token_count,
             completion_tokens: self.candidates_token_count, // Note: Gemini sums *all* candidates if > 1
             total_tokens: self.total_token_count,
+            cached_prompt_tokens: self.cached_content_token_count,
         }        
     }
 }
 
+// --- Batch Structs ---
+
+/// State of a batch job submitted with [`GeminiChatClient::submit_batch`].
+#[derive(Deserialize, Debug, Clone, Copy, PartialEq, Eq, Default)]
+pub enum GeminiBatchState {
+    #[serde(rename = "BATCH_STATE_PENDING", alias = "JOB_STATE_PENDING")]
+    Pending,
+    #[serde(rename = "BATCH_STATE_RUNNING", alias = "JOB_STATE_RUNNING")]
+    Running,
+    #[serde(rename = "BATCH_STATE_SUCCEEDED", alias = "JOB_STATE_SUCCEEDED")]
+    Succeeded,
+    #[serde(rename = "BATCH_STATE_FAILED", alias = "JOB_STATE_FAILED")]
+    Failed,
+    #[serde(rename = "BATCH_STATE_CANCELLED", alias = "JOB_STATE_CANCELLED")]
+    Cancelled,
+    #[serde(rename = "BATCH_STATE_EXPIRED", alias = "JOB_STATE_EXPIRED")]
+    Expired,
+    #[default]
+    #[serde(other)]
+    Unspecified,
+}
+
+/// Outcome of polling a batch job.
+#[derive(Debug)]
+pub enum GeminiBatchStatus {
+    /// The job has not finished yet.
+    InProgress(GeminiBatchState),
+    /// The job succeeded. Holds one result per submitted request, in submission order.
+    Completed(Vec<Result<ChatResponse, ChatError>>),
+}
+
+/// Long-running operation describing a batch job, returned on submission and when polling.
 #[derive(Deserialize, Debug)]
-struct GeminiErrorResponse {
-    error: GeminiErrorDetail,
-}
-
-impl GeminiErrorResponse {
-    fn into_api_error(self, response_status: StatusCode) -> ChatError {
-        let msg = format!("{} (Status: {}, Code: {})", self.error.message, self.error.status, self.error.code);
-        match response_status.as_u16() {
-            400 => ChatError::InvalidRequest(msg),
-            401 | 403 => ChatError::Authentication(msg),
-            404 => ChatError::ModelNotFound(msg), // Or potentially other 404 reasons
-            429 => ChatError::RateLimited,
-            500..=599 => ChatError::Api { 
-                status: Some(response_status.as_u16()),
-                message: msg,
-                source: None,
-            },
-            _ => ChatError::Api { 
-                status: Some(response_status.as_u16()), 
-                message: msg,
-                source: None,
-            },
+struct GeminiBatchOperation {
+    name: String, // Format: "batches/{id}"
+    #[serde(default)]
+    done: bool,
+    #[serde(default)]
+    metadata: Option<GeminiBatchMetadata>,
+    #[serde(default)]
+    response: Option<GeminiBatchOutput>,
+    #[serde(default)]
+    error: Option<GeminiStatus>,
+}
+
+impl GeminiBatchOperation {
+    /// Interprets a polled operation. `default_model_id` is used for the responses if the
+    /// operation does not name its model.
+    fn into_status(self, default_model_id: &str) -> Result<GeminiBatchStatus, GeminiError> {
+        let metadata = self.metadata.unwrap_or(GeminiBatchMetadata { model: None, state: GeminiBatchState::Unspecified });
+        trace!(state = ?metadata.state, done = self.done, "Polled Gemini batch job");
+
+        // An operation error means the job has finished, whatever the reported state
+        if let Some(error) = self.error {
+            return Err(GeminiError::BatchJob(format!(
+                "{} ended in state {:?}: {} (Code: {})", self.name, metadata.state, error.message, error.code
+            )));
+        }
+        match metadata.state {
+            GeminiBatchState::Failed | GeminiBatchState::Cancelled | GeminiBatchState::Expired => {
+                return Err(GeminiError::BatchJob(format!("{} ended in state {:?}", self.name, metadata.state)));
+            }
+            GeminiBatchState::Succeeded => {}
+            _ if self.done => {}
+            state => return Ok(GeminiBatchStatus::InProgress(state)),
         }
+
+        // Responses carry no model ID, so attribute them to the batch's model
+        let model_id = metadata.model.as_deref()
+            .map(|model| model.strip_prefix("models/").unwrap_or(model))
+            .unwrap_or(default_model_id);
+        let inlined = self.response
+            .and_then(|output| output.inlined_responses)
+            .ok_or_else(|| GeminiError::BatchJob(format!("{} finished without inlined responses", self.name)))?;
+        let results = inlined.inlined_responses.into_iter()
+            .map(|item| match (item.response, item.error) {
+                (_, Some(status)) => Err(ChatError::Api {
+                    status: None,
+                    message: format!("{} (Code: {})", status.message, status.code),
+                    source: None,
+                }),
+                (Some(response), None) => response.into_chat_response(model_id).map_err(Into::into),
+                (None, None) => Err(GeminiError::UnexpectedResponse("Batch item has neither response nor error".to_string()).into()),
+            })
+            .collect();
+        Ok(GeminiBatchStatus::Completed(results))
     }
 }
 
 #[derive(Deserialize, Debug)]
-struct GeminiErrorDetail {
-    code: u16,
-    message: String,
-    status: String, // e.g. "INVALID_ARGUMENT"
+struct GeminiBatchMetadata {
+    #[serde(default)]
+    model: Option<String>, // Format: "models/{model_id}"
+    #[serde(default)]
+    state: GeminiBatchState,
+}
+
+#[derive(Deserialize, Debug)]
+#[serde(rename_all = "camelCase")]
+struct GeminiBatchOutput {
+    #[serde(default)]
+    inlined_responses: Option<GeminiInlinedResponses>,
+}
+
+#[derive(Deserialize, Debug)]
+#[serde(rename_all = "camelCase")]
+struct GeminiInlinedResponses {
+    #[serde(default)]
+    inlined_responses: Vec<GeminiInlinedResponse>,
+}
+
+/// Result of one request in a batch: either a response or an error.
+#[derive(Deserialize, Debug)]
+struct GeminiInlinedResponse {
+    #[serde(default)]
+    response: Option<GeminiGenerateResponse>,
+    #[serde(default)]
+    error: Option<GeminiStatus>,
 }
 
 // --- Model Info Structs ---
@@ -481,14 +773,29 @@ struct GeminiModelInfo {
 
 // ============== Gemini Client Implementation ==============
 
-const DEFAULT_GEMINI_API_BASE: &str = "https://generativelanguage.googleapis.com/v1beta/models";
 const DEFAULT_GEMINI_CHAT_MODEL: &str = "gemini-2.0-flash-lite";
+const DEFAULT_BATCH_CONCURRENCY: usize = 16;
+const MAX_BATCH_POLL_INTERVAL: Duration = Duration::from_secs(60);
+
+/// Endpoint URLs of one model, built once per model and reused for every request.
+#[derive(Debug)]
+struct ModelEndpoints {
+    generate: Url,
+    stream: Url, // Includes the `alt=sse` query
+}
 
 #[derive(Debug, Clone)]
 pub struct GeminiChatClient {
     shared_client: Arc<SharedGeminiClient>,
     default_model_id: String,
-    // Add any chat-specific config here if needed later
+    /// Endpoint URLs per model ID, shared by all clones of this client.
+    endpoints: Arc<RwLock<HashMap<String, Arc<ModelEndpoints>>>>,
+    /// Explicit context caching of long conversation prefixes (disabled by default).
+    context_cache: Option<Arc<ContextCache>>,
+    /// In-memory cache of responses to exact repeats of a request (disabled by default).
+    response_cache: Option<Arc<ResponseCache>>,
+    /// Identical requests currently in flight, if request coalescing is enabled.
+    in_flight: Option<Arc<InFlightRequests>>,
 }
 
 impl GeminiChatClient {
@@ -528,85 +835,372 @@ impl GeminiChatClient {
         Ok(Self {
             shared_client,
             default_model_id: model_id,
+            endpoints: Arc::new(RwLock::new(HashMap::new())),
+            context_cache: None,
+            response_cache: None,
+            in_flight: None,
         })
     }    
 
-    // TO BE REMOVED/REPLACED
-    /// Maps Gemini API errors (parsed from JSON or status codes) to our ChatError enum.
-    async fn map_gemini_error(err_resp: reqwest::Response) -> ChatError {
-        let status = err_resp.status();
-        let error_text_result = err_resp.text().await; // Consume body to attempt parsing
-
-        match error_text_result {
-            Ok(error_text) => {
-                trace!(status = %status, error_body = %error_text, "Gemini API error response body");
-                // Try parsing Gemini's specific error format
-                match serde_json::from_str::<GeminiErrorResponse>(&error_text) {
-                    Ok(gemini_error) => {
-                        gemini_error.into_api_error(status)
-                    }
-                    Err(parse_err) => {
-                        // Couldn't parse the specific error format, return generic API error
-                        warn!(parse_error = %parse_err, body = %error_text, "Failed to parse Gemini error response JSON");
-                        ChatError::Api { 
-                            status: Some(status.as_u16()), 
-                            message: error_text, 
-                            source: Some(Box::new(parse_err)),
-                        }
-                    }
-                }
-            },
-            Err(text_err) => {
-                // Failed even to read the error body text
-                error!(status = %status, text_error = %text_err, "Failed to read Gemini error response body text");
-                ChatError::Api { 
-                    status: Some(status.as_u16()), 
-                    message: format!("Failed to read error response body: {}", text_err),
-                    source: Some(Box::new(text_err)),
+    /// Enables explicit context caching for long conversations.
+    ///
+    /// When the conversation prefix (system instruction, tools and all but the last message)
+    /// is estimated to exceed `min_prefix_tokens`, it is uploaded once as a Gemini
+    /// `cachedContents` resource with the given `ttl`. Later requests sharing that prefix
+    /// only send the remaining messages. Note that Gemini enforces a model-specific minimum
+    /// size for cached content; smaller prefixes are sent uncached.
+    ///
+    /// Cache creation is not coalesced: concurrent requests sharing a prefix that is not
+    /// cached yet each create (and are billed for) their own cache. Send the first turn of
+    /// a conversation before fanning out concurrent follow-ups to avoid this.
+    ///
+    /// # Errors
+    /// Returns `GeminiError::InvalidConfiguration` if `ttl` is 10 seconds or less. Entries
+    /// are considered expired that long before the server drops them, so such caches
+    /// could never be reused.
+    pub fn with_context_caching(mut self, min_prefix_tokens: usize, ttl: Duration) -> Result<Self, GeminiError> {
+        if ttl <= EXPIRY_MARGIN {
+            return Err(GeminiError::InvalidConfiguration(format!(
+                "Context cache TTL must be longer than {}s (got {:?})", EXPIRY_MARGIN.as_secs(), ttl
+            )));
+        }
+        self.context_cache = Some(Arc::new(ContextCache::new(min_prefix_tokens, ttl)));
+        Ok(self)
+    }
+
+    /// Enables an in-memory cache holding up to `capacity` responses.
+    ///
+    /// A request with the same model, messages and options as a cached one is answered
+    /// from the cache without contacting the API. Since sampling is not deterministic,
+    /// this is only appropriate where repeating an earlier answer is acceptable.
+    pub fn with_response_cache(mut self, capacity: usize) -> Self {
+        self.response_cache = Some(Arc::new(ResponseCache::new(capacity)));
+        self
+    }
+
+    /// Enables coalescing of identical concurrent requests.
+    ///
+    /// While a request is in flight, further requests with the same model, messages and
+    /// options wait for its response instead of calling the API again. If the first request
+    /// fails, the waiting ones are sent individually. Like the response cache, this is only
+    /// appropriate where identical requests may receive identical answers.
+    pub fn with_request_coalescing(mut self) -> Self {
+        self.in_flight = Some(Arc::new(InFlightRequests::new()));
+        self
+    }
+
+    /// Estimates the number of prompt tokens `messages` would use, without calling the API.
+    ///
+    /// This is an approximation: text is tokenized locally with OpenAI's cl100k_base
+    /// vocabulary (Gemini's own tokenizer is not available offline), and images are counted
+    /// at Gemini's fixed per-image rate. Tokenizing runs on tokio's blocking thread pool.
+    pub async fn estimate_tokens(&self, messages: &[Message]) -> Result<usize, ChatError> {
+        let (system_instruction, contents) = Self::convert_messages(messages)?;
+        tokio::task::spawn_blocking(move || {
+            system_instruction.iter()
+                .chain(&contents)
+                .map(|content| content.estimated_tokens(estimate_text_tokens))
+                .sum()
+        })
+        .await
+        .map_err(|e| ChatError::Provider(Box::new(e)))
+    }
+
+    /// Returns the endpoint URLs for `model_id`, building them on first use.
+    fn model_endpoints(&self, model_id: &str) -> Result<Arc<ModelEndpoints>, GeminiError> {
+        if let Some(endpoints) = self.endpoints.read().unwrap().get(model_id) {
+            return Ok(endpoints.clone());
+        }
+
+        let generate = self.shared_client.build_url(&format!("models/{}:generateContent", model_id))?;
+        let mut stream = self.shared_client.build_url(&format!("models/{}:streamGenerateContent", model_id))?;
+        stream.set_query(Some("alt=sse")); // SSE framing, one response chunk per event
+        let endpoints = Arc::new(ModelEndpoints { generate, stream });
+        self.endpoints.write().unwrap().insert(model_id.to_string(), endpoints.clone());
+        Ok(endpoints)
+    }
+
+    /// Generates responses for several independent conversations concurrently.
+    ///
+    /// At most `max_concurrency` requests (default: 16) are in flight at any time.
+    /// Results are returned in the same order as `requests`; a failed request does not
+    /// affect the others.
+    #[instrument(skip(self, requests), fields(num_requests = requests.len()))]
+    pub async fn generate_batch(
+        &self,
+        requests: &[(Vec<Message>, ChatOptions)],
+        max_concurrency: Option<usize>,
+    ) -> Vec<Result<ChatResponse, ChatError>> {
+        let max_concurrency = max_concurrency.unwrap_or(DEFAULT_BATCH_CONCURRENCY).max(1);
+        debug!(max_concurrency, "Sending batch of generate requests to Gemini");
+        futures::stream::iter(requests)
+            .map(|(messages, options)| self.generate(messages, options))
+            .buffered(max_concurrency)
+            .collect()
+            .await
+    }
+
+    /// Submits requests as a Gemini batch job and returns the job name (e.g. "batches/abc123").
+    ///
+    /// Batch jobs are processed asynchronously, typically within minutes to hours, at a
+    /// lower price than interactive requests and outside the per-minute rate limits. Use
+    /// [`poll_batch`](Self::poll_batch) or [`wait_for_batch`](Self::wait_for_batch) to
+    /// retrieve the results. All requests must use the same model.
+    #[instrument(skip(self, requests), fields(num_requests = requests.len()))]
+    pub async fn submit_batch(&self, requests: &[(Vec<Message>, ChatOptions)]) -> Result<String, ChatError> {
+        async {
+            // 1. Determine the (single) model of the batch
+            let Some(((_, first_options), rest)) = requests.split_first() else {
+                return Err(GeminiError::InvalidInput("Batch must contain at least one request".to_string()));
+            };
+            let model_id = first_options.model_id.as_deref().unwrap_or(&self.default_model_id);
+            if rest.iter().any(|(_, options)| options.model_id.as_deref().unwrap_or(&self.default_model_id) != model_id) {
+                return Err(GeminiError::InvalidInput("All requests of a batch must use the same model".to_string()));
+            }
+
+            // 2. Build Request Body
+            let requests = requests.iter()
+                .map(|(messages, options)| {
+                    Self::new_generate_request(messages, options)
+                        .map(|request| GeminiInlinedRequest { request })
+                })
+                .collect::<Result<Vec<_>, _>>()?;
+            let request_body = GeminiBatchGenerateRequest {
+                batch: GeminiBatchSpec {
+                    display_name: format!("markhor-{}", Uuid::new_v4()),
+                    input_config: GeminiBatchInputConfig {
+                        requests: GeminiInlinedRequests { requests },
+                    },
+                },
+            };
+            let request_json = serde_json::to_vec(&request_body)
+                .map_err(GeminiError::RequestSerialization)?;
+
+            // 3. Send Request (batch jobs have their own quota, so no throttling)
+            let url = self.shared_client.build_url(&format!("models/{}:batchGenerateContent", model_id))?;
+            debug!(%url, %model_id, "Submitting batch job to Gemini");
+            let response = self.shared_client
+                .authorize(self.shared_client.http_client()?.post(url))
+                .header("Content-Type", "application/json")
+                .body(request_json)
+                .send()
+                .await
+                .map_err(GeminiError::Network)?;
+            let operation = Self::parse_batch_operation(response).await?;
+            debug!(batch = %operation.name, "Submitted Gemini batch job");
+            Ok(operation.name)
+        }
+        .await
+        .map_err(Into::into)
+    }
+
+    /// Checks the state of a batch job, returning its results once it has succeeded.
+    ///
+    /// # Errors
+    /// Returns an error if the job failed, was cancelled or expired.
+    #[instrument(skip(self))]
+    pub async fn poll_batch(&self, batch_name: &str) -> Result<GeminiBatchStatus, ChatError> {
+        async {
+            let url = self.shared_client.build_url(batch_name)?;
+            let response = self.shared_client
+                .authorize(self.shared_client.http_client()?.get(url))
+                .send()
+                .await
+                .map_err(GeminiError::Network)?;
+            let operation = Self::parse_batch_operation(response).await?;
+            operation.into_status(&self.default_model_id)
+        }
+        .await
+        .map_err(Into::into)
+    }
+
+    /// Polls a batch job until it finishes and returns its results.
+    ///
+    /// The polling interval doubles after every attempt, up to one minute.
+    pub async fn wait_for_batch(&self, batch_name: &str) -> Result<Vec<Result<ChatResponse, ChatError>>, ChatError> {
+        let mut interval = Duration::from_secs(1);
+        loop {
+            match self.poll_batch(batch_name).await? {
+                GeminiBatchStatus::Completed(results) => return Ok(results),
+                GeminiBatchStatus::InProgress(state) => {
+                    debug!(batch = %batch_name, ?state, retry_in_secs = interval.as_secs(), "Gemini batch job not finished yet");
+                    tokio::time::sleep(interval).await;
+                    interval = (interval * 2).min(MAX_BATCH_POLL_INTERVAL);
                 }
             }
         }
     }
 
+    /// Checks the status of a batch job response and parses the operation it contains.
+    async fn parse_batch_operation(response: reqwest::Response) -> Result<GeminiBatchOperation, GeminiError> {
+        if !response.status().is_success() {
+            return Err(map_response_error(response).await);
+        }
+        let raw_body = response.bytes().await.map_err(GeminiError::Network)?;
+        serde_json::from_slice(&raw_body)
+            .map_err(|e| GeminiError::ResponseParsing {
+                context: "Parsing batch operation".to_string(),
+                source: e,
+            })
+    }
+
+    /// Converts messages and options into a request body, without any caching applied.
+    fn new_generate_request(messages: &[Message], options: &ChatOptions) -> Result<GeminiGenerateRequest, GeminiError> {
+        let (system_instruction, contents) = Self::convert_messages(messages)?;
+        let (tools, tool_config) = Self::convert_tools(options);
+        Ok(GeminiGenerateRequest {
+            contents,
+            tools,
+            tool_config,
+            system_instruction,
+            generation_config: GeminiGenerationConfig::from_options(options),
+            // safety_settings: None, // Add if needed
+            cached_content: None,
+        })
+    }
+
+    /// Builds the request body shared by `generate` and `generate_stream`.
+    async fn build_generate_request(
+        &self,
+        model_id: &str,
+        messages: &[Message],
+        options: &ChatOptions,
+    ) -> Result<GeminiGenerateRequest, GeminiError> {
+        // 1. Convert Inputs (Messages and Tools) and Construct Request Body
+        let mut request_body = Self::new_generate_request(messages, options)?;
+
+        // 2. Reuse a cached conversation prefix if context caching is enabled
+        if let Some(cache) = &self.context_cache {
+            if let Some((name, covered)) = self.resolve_context_cache(cache, model_id, &request_body).await {
+                debug!(cache = %name, covered, "Sending request against cached prefix");
+                // System instruction and tools are part of the cached content
+                request_body.contents.drain(..covered);
+                request_body.system_instruction = None;
+                request_body.tools = None;
+                request_body.tool_config = None;
+                request_body.cached_content = Some(name);
+            }
+        }
+
+        Ok(request_body)
+    }
+
+    /// Finds (or creates) a server-side cache for a leading part of the request's contents.
+    ///
+    /// Returns the cache name and the number of leading `contents` it covers. Only the
+    /// prefix before the last message is considered. Failures are logged and result in
+    /// `None`, so the request can still be sent uncached.
+    async fn resolve_context_cache(
+        &self,
+        cache: &ContextCache,
+        model_id: &str,
+        request: &GeminiGenerateRequest,
+    ) -> Option<(String, usize)> {
+        let prefix_len = request.contents.len().saturating_sub(1);
+        if prefix_len == 0 {
+            return None; // Single-turn request, nothing worth caching
+        }
+
+        // Prefer the longest prefix that is already cached
+        let keys = request.prefix_keys(model_id)?;
+        if let Some(found) = cache.lookup_longest(&keys) {
+            return Some(found);
+        }
+
+        // Tools are not counted; they rarely make up a significant part of the prefix.
+        // A cheap approximation suffices for the threshold and keeps the executor unblocked.
+        let estimated_tokens = request.system_instruction.iter()
+            .chain(&request.contents[..prefix_len])
+            .map(|content| content.estimated_tokens(approximate_text_tokens))
+            .sum::<usize>();
+        if estimated_tokens < cache.min_prefix_tokens() {
+            trace!(estimated_tokens, "Conversation prefix too small for context caching");
+            return None;
+        }
+
+        let create_request = GeminiCreateCachedContentRequest {
+            model: format!("models/{}", model_id),
+            contents: &request.contents[..prefix_len],
+            system_instruction: request.system_instruction.as_ref(),
+            tools: request.tools.as_ref(),
+            tool_config: request.tool_config.as_ref(),
+            ttl: format!("{}s", cache.ttl().as_secs()),
+        };
+        match self.create_cached_content(&create_request).await {
+            Ok(name) => {
+                debug!(cache = %name, estimated_tokens, "Created Gemini context cache");
+                cache.insert(keys[prefix_len - 1], name.clone());
+                Some((name, prefix_len))
+            }
+            Err(e) => {
+                warn!(error = %e, "Failed to create Gemini context cache, sending request uncached");
+                None
+            }
+        }
+    }
+
+    /// Creates a `cachedContents` resource and returns its name.
+    async fn create_cached_content(
+        &self,
+        request: &GeminiCreateCachedContentRequest<'_>,
+    ) -> Result<String, GeminiError> {
+        let url = self.shared_client.build_url("cachedContents")?;
+        let request_json = serde_json::to_vec(request)
+            .map_err(GeminiError::RequestSerialization)?;
+
+        // Cached tokens are not generated against, so only count the request itself
+        self.shared_client.throttle(|| 0).await;
+        let response = self.shared_client
+            .authorize(self.shared_client.http_client()?.post(url))
+            .header("Content-Type", "application/json")
+            .body(request_json)
+            .send()
+            .await
+            .map_err(GeminiError::Network)?;
+
+        if !response.status().is_success() {
+            return Err(map_response_error(response).await);
+        }
+
+        let raw_body = response.bytes().await.map_err(GeminiError::Network)?;
+        let cached: GeminiCachedContent = serde_json::from_slice(&raw_body)
+            .map_err(|e| GeminiError::ResponseParsing {
+                context: "Parsing cachedContents response".to_string(),
+                source: e,
+            })?;
+        Ok(cached.name)
+    }
+
     /// Converts Markhor's internal message format to Gemini's Content format.
     /// Separates the system prompt.
     fn convert_messages(
         messages: &[Message],
     ) -> Result<(Option<GeminiContent>, Vec<GeminiContent>), GeminiError> { // Return GeminiError
-        let mut system_instruction: Option<GeminiContent> = None;
-        let mut gemini_contents: Vec<GeminiContent> = Vec::with_capacity(messages.len());
-        let mut system_message_found = false;
-
-        for message in messages {
-            match message {
-                Message::System(parts) => {
-                    if system_message_found {
-                        // Found a second system message
-                        return Err(GeminiError::InvalidInput(
-                            "Multiple System messages are not supported by Gemini; use 'system_instruction'.".to_string()
-                        ));
-                    }
-                    system_message_found = true;
-                    // We only handle text system prompts for now
-                    let combined_text = parts.iter()
-                        .filter_map(|part| part.clone().into_text())
-                        .collect::<Vec<_>>()
-                        .join("\n");
-
-                    system_instruction = Some(GeminiContent {
-                        // Role is ignored by API for system_instruction, but struct needs it.
-                        // Use "user" as per Gemini examples for system_instruction content.
-                        role: "user".to_string(),
-                        parts: vec![GeminiPart::Text { text: combined_text }],
-                    });
-                    // Do not add system message to the main contents list
-                }
-                _ => {
-                    // Convert other message types
-                    gemini_contents.push(GeminiContent::from(message.clone()));
-                }
-            }
+        let mut system_messages = messages.iter().filter_map(|message| match message {
+            Message::System(parts) => Some(parts),
+            _ => None,
+        });
+        // We only handle text system prompts for now
+        let system_instruction = system_messages.next().map(|parts| GeminiContent {
+            // Role is ignored by API for system_instruction, but struct needs it.
+            // Use "user" as per Gemini examples for system_instruction content.
+            role: "user".to_string(),
+            parts: vec![GeminiPart::Text { text: join_text_parts(parts) }],
+        });
+        if system_messages.next().is_some() {
+            // Found a second system message
+            return Err(GeminiError::InvalidInput(
+                "Multiple System messages are not supported by Gemini; use 'system_instruction'.".to_string()
+            ));
         }
+
+        // Convert other message types, without cloning them first.
+        // System messages are not added to the main contents list.
+        let mut gemini_contents = Vec::with_capacity(messages.len() - usize::from(system_instruction.is_some()));
+        gemini_contents.extend(messages.iter()
+            .filter(|message| !matches!(message, Message::System(_)))
+            .map(GeminiContent::from));
+
         Ok((system_instruction, gemini_contents))
     }
 
@@ -673,9 +1267,8 @@ impl ChatApi for GeminiChatClient {
             debug!(%url, "Requesting Gemini models list");
 
             // 2. Get HTTP client and send request
-            let response = self.shared_client.http_client()
-                .get(url)
-                .header("x-goog-api-key", self.shared_client.config().api_key.expose_secret()) // API Key in header
+            let response = self.shared_client
+                .authorize(self.shared_client.http_client()?.get(url)) // API Key in header
                 .send()
                 .await
                 .map_err(GeminiError::Network)?; // Convert reqwest error to GeminiError::Network
@@ -691,19 +1284,19 @@ impl ChatApi for GeminiChatClient {
             // 5. Process successful response
             let status = response.status();
             debug!(%status, "Received successful response for model list");
-            let raw_body = response.text()
+            let raw_body = response.bytes()
                 .await
                 .map_err(|e| {
                     // Failed to read body even on success status - likely network issue during read
                     error!(error = %e, "Failed to read successful response body for model list");
                     GeminiError::Network(e)
                 })?;
-            trace!(body = %raw_body, "Received model list response body");
+            trace!(body = %String::from_utf8_lossy(&raw_body), "Received model list response body");
 
             // 6. Parse JSON response
-            let list_response: GeminiListModelsResponse = serde_json::from_str(&raw_body)
+            let list_response: GeminiListModelsResponse = serde_json::from_slice(&raw_body)
                 .map_err(|e| { 
-                    error!(parse_error = %e, raw_body = %raw_body, "Failed to parse Gemini model list JSON");
+                    error!(parse_error = %e, raw_body = %String::from_utf8_lossy(&raw_body), "Failed to parse Gemini model list JSON");
                     GeminiError::ResponseParsing {
                         context: "Parsing model list".to_string(),
                         source: e,
@@ -755,50 +1348,52 @@ impl ChatApi for GeminiChatClient {
                 .model_id
                 .as_deref()
                 .unwrap_or(&self.default_model_id);
-            let path_segment = format!("models/{}:generateContent", model_id);
-            let url = self.shared_client.build_url(&path_segment)?; // Adds API key
-            debug!(%url, %model_id, "Sending generate request to Gemini");
 
-            // 2. Convert Inputs (Messages and Tools)
-            let (system_instruction, gemini_contents) = Self::convert_messages(messages)?;
-            let (tools, tool_config) = Self::convert_tools(options);
-
-            // 3. Construct Generation Config
-            let generation_config = GeminiGenerationConfig {
-                temperature: options.temperature,
-                top_p: options.top_p,
-                max_output_tokens: options.max_tokens,
-                stop_sequences: options.stop_sequences.clone(),
-                candidate_count: Some(1), // Usually want just one candidate for chat
-                // response_mime_type: options.response_format // Map if/when needed
-                ..Default::default()
-            };
+            // Answer exact repeats from the response cache, if enabled
+            let cache_key = (self.response_cache.is_some() || self.in_flight.is_some())
+                .then(|| request_key(model_id, messages, options))
+                .flatten();
+            if let (Some(cache), Some(key)) = (&self.response_cache, cache_key) {
+                if let Some(response) = cache.get(key) {
+                    debug!(%model_id, "Returning cached response for repeated request");
+                    return Ok(response);
+                }
+            }
 
-            // 4. Construct Request Body
-            let request_body = GeminiGenerateRequest {
-                contents: gemini_contents,
-                tools,
-                tool_config,
-                system_instruction,
-                generation_config: Some(generation_config).filter(|c| {
-                    // Only include config if it's not default/empty (optimization)
-                    c.temperature.is_some() || c.top_p.is_some() || c.max_output_tokens.is_some() || c.stop_sequences.is_some()
-                }),
-                // safety_settings: None, // Add if needed
+            // Wait for an identical request already in flight, if coalescing is enabled
+            let flight = match (&self.in_flight, cache_key) {
+                (Some(in_flight), Some(key)) => match in_flight.join(key) {
+                    Flight::Leader(guard) => Some(guard),
+                    Flight::Follower(mut receiver) => {
+                        if let Ok(Some(response)) = receiver.recv().await {
+                            debug!(%model_id, "Reusing response of identical in-flight request");
+                            return Ok(response);
+                        }
+                        debug!(%model_id, "Identical in-flight request failed, sending own request");
+                        None
+                    }
+                },
+                _ => None,
             };
 
-            // 5. Serialize Request Body
-            let request_json = serde_json::to_string(&request_body)
+            let url = self.model_endpoints(model_id)?.generate.clone();
+            debug!(%url, %model_id, "Sending generate request to Gemini");
+
+            // 2. Build Request Body (reusing a cached prefix if enabled)
+            let request_body = self.build_generate_request(model_id, messages, options).await?;
+
+            // 3. Serialize Request Body
+            let request_json = serde_json::to_vec(&request_body)
                 .map_err(|e| {
                     error!(error = %e, "Failed to serialize Gemini generate request body");
                     GeminiError::RequestSerialization(e)
                 })?;
-            trace!(body = %request_json, "Constructed Gemini request body JSON"); // Log JSON, not Debug format
+            trace!(body = %String::from_utf8_lossy(&request_json), "Constructed Gemini request body JSON"); // Log JSON, not Debug format
 
-            // 6. Send Request
-            let response = self.shared_client.http_client()
-                .post(url)
-                .header("x-goog-api-key", self.shared_client.config().api_key.expose_secret()) // API Key in header
+            // 4. Wait for the client-side rate limit, then Send Request
+            self.shared_client.throttle(|| request_body.estimated_tokens()).await;
+            let response = self.shared_client
+                .authorize(self.shared_client.http_client()?.post(url)) // API Key in header
                 .header("Content-Type", "application/json") // Standard header
                 // Add User-Agent or other headers if desired
                 .body(request_json)
@@ -806,29 +1401,29 @@ impl ChatApi for GeminiChatClient {
                 .await
                 .map_err(GeminiError::Network)?;
 
-            // 7. Check Response Status
+            // 5. Check Response Status
             if !response.status().is_success() {
                 let status = response.status();
                 error!(%status, "Gemini generate API returned error status");
-                // 8. Map Error Response
+                // 6. Map Error Response
                 return Err(map_response_error(response).await);
             }
 
-            // 9. Process Successful Response
+            // 7. Process Successful Response
             let status = response.status();
             debug!(%status, "Received successful response for generate request");
-             let raw_body = response.text()
+             let raw_body = response.bytes()
                 .await
                 .map_err(|e| {
                     error!(error = %e, "Failed to read successful response body for generate");
                     GeminiError::Network(e)
                 })?;
-             trace!(body = %raw_body, "Received Gemini generate response body");
+             trace!(body = %String::from_utf8_lossy(&raw_body), "Received Gemini generate response body");
 
-            // 10. Parse JSON Response
-            let gemini_response: GeminiGenerateResponse = serde_json::from_str(&raw_body)
+            // 8. Parse JSON Response
+            let gemini_response: GeminiGenerateResponse = serde_json::from_slice(&raw_body)
                 .map_err(|e| {
-                    error!(parse_error = %e, raw_body = %raw_body, "Failed to parse Gemini generate response JSON");
+                    error!(parse_error = %e, raw_body = %String::from_utf8_lossy(&raw_body), "Failed to parse Gemini generate response JSON");
                     GeminiError::ResponseParsing {
                         context: "Parsing generate response".to_string(),
                         source: e,
@@ -837,8 +1432,15 @@ impl ChatApi for GeminiChatClient {
 
             debug!("Successfully parsed Gemini generate response");
 
-            // 11. Convert to public ChatResponse struct
-            gemini_response.into_chat_response(model_id) // This now returns Result<..., GeminiError>
+            // 9. Convert to public ChatResponse struct
+            let chat_response = gemini_response.into_chat_response(model_id)?;
+            if let (Some(cache), Some(key)) = (&self.response_cache, cache_key) {
+                cache.insert(key, chat_response.clone());
+            }
+            if let Some(guard) = flight {
+                guard.complete(chat_response.clone());
+            }
+            Ok(chat_response)
         }
         .await // Execute the inner async block
         .map_err(Into::into) // Convert GeminiError into ChatError at the boundary
@@ -850,33 +1452,408 @@ impl ChatApi for GeminiChatClient {
         messages: &[Message],
         options: &ChatOptions,
     ) -> Result<ChatStream, ChatError> {
-        // TODO: Implement streaming for Gemini
-        // This involves:
-        // 1. Adding ":streamGenerateContent" to the URL.
-        // 2. Sending the same request body.
-        // 3. Handling the response as a stream of Server-Sent Events (SSE).
-        // 4. Parsing each SSE chunk (which will be JSON, similar to GeminiGenerateResponse but partial/delta).
-        // 5. Extracting text deltas from `candidates[0].content.parts[0].text`.
-        // 6. Handling potential errors within the stream.
-        // 7. Mapping the stream items to `Result<String, ChatError>`.
-        warn!("Gemini streaming is not yet implemented.");
-        Err(ChatError::NotSupported("Streaming is not yet implemented for the Gemini client.".to_string()))
+        // Inner async block returning Result<..., GeminiError>
+        async {
+            // 1. Determine Model ID and Build URL
+            let model_id = options
+                .model_id
+                .as_deref()
+                .unwrap_or(&self.default_model_id);
+            let url = self.model_endpoints(model_id)?.stream.clone();
+            debug!(%url, %model_id, "Sending streaming generate request to Gemini");
+
+            // 2. Build and Serialize Request Body (same as for `generate`)
+            let request_body = self.build_generate_request(model_id, messages, options).await?;
+            let request_json = serde_json::to_vec(&request_body)
+                .map_err(|e| {
+                    error!(error = %e, "Failed to serialize Gemini stream request body");
+                    GeminiError::RequestSerialization(e)
+                })?;
+            trace!(body = %String::from_utf8_lossy(&request_json), "Constructed Gemini stream request body JSON");
+
+            // 3. Send Request
+            self.shared_client.throttle(|| request_body.estimated_tokens()).await;
+            let response = self.shared_client
+                .authorize(self.shared_client.http_client()?.post(url))
+                .header("Content-Type", "application/json")
+                .body(request_json)
+                .send()
+                .await
+                .map_err(GeminiError::Network)?;
+
+            if !response.status().is_success() {
+                let status = response.status();
+                error!(%status, "Gemini stream API returned error status");
+                return Err(map_response_error(response).await);
+            }
+
+            // 4. Decode the body incrementally as it arrives
+            Ok(GeminiStreamState::new(Box::pin(response.bytes_stream())).into_chat_stream())
+        }
+        .await
+        .map_err(Into::into)
     }
 }
 
 
-// Helper function to create a reqwest client (useful for examples/tests)
-// Consider moving this to a more central place if used by multiple clients
-pub fn create_default_http_client() -> Result<reqwest::Client, ChatError> {
-    reqwest::Client::builder()
-       .timeout(std::time::Duration::from_secs(60)) // Example timeout
-       .build()
-       .map_err(|e| ChatError::Configuration(format!("Failed to build HTTP client: {}", e)))
+/// State for turning a streamed `streamGenerateContent` response into `StreamChunk`s.
+struct GeminiStreamState<S> {
+    bytes: S,
+    decoder: SseDecoder,
+    pending: VecDeque<Result<StreamChunk, ChatError>>,
+    finish_reason: Option<FinishReason>,
+    usage: Option<UsageInfo>,
+    done: bool,
+}
+
+impl<S, B> GeminiStreamState<S>
+where
+    S: Stream<Item = Result<B, reqwest::Error>> + Send + Unpin + 'static,
+    B: AsRef<[u8]> + Send + 'static,
+{
+    fn new(bytes: S) -> Self {
+        Self {
+            bytes,
+            decoder: SseDecoder::new(),
+            pending: VecDeque::new(),
+            finish_reason: None,
+            usage: None,
+            done: false,
+        }
+    }
+
+    fn into_chat_stream(self) -> ChatStream {
+        Box::pin(futures::stream::unfold(self, |mut state| async move {
+            loop {
+                if let Some(item) = state.pending.pop_front() {
+                    return Some((item, state));
+                }
+                if state.done {
+                    return None;
+                }
+                match state.bytes.next().await {
+                    Some(Ok(chunk)) => {
+                        for event in state.decoder.push(chunk.as_ref()) {
+                            state.handle_event(&event);
+                        }
+                    }
+                    Some(Err(e)) => {
+                        error!(error = %e, "Network error while reading Gemini stream");
+                        state.pending.push_back(Err(GeminiError::Network(e).into()));
+                        state.done = true;
+                    }
+                    None => {
+                        if let Some(event) = state.decoder.finish() {
+                            state.handle_event(&event);
+                        }
+                        if !state.done {
+                            state.pending.push_back(Ok(StreamChunk::StreamEnd {
+                                finish_reason: state.finish_reason.take().unwrap_or(FinishReason::Unspecified),
+                                usage: state.usage.take(),
+                            }));
+                            state.done = true;
+                        }
+                    }
+                }
+            }
+        }))
+    }
+
+    /// Converts one SSE event (a partial `GenerateContentResponse`) into stream chunks.
+    fn handle_event(&mut self, event: &[u8]) {
+        if self.done {
+            return; // Ignore anything following an error
+        }
+        let chunk: GeminiGenerateResponse = match serde_json::from_slice(event) {
+            Ok(chunk) => chunk,
+            Err(e) => {
+                error!(parse_error = %e, raw_event = %String::from_utf8_lossy(event), "Failed to parse Gemini stream chunk");
+                self.pending.push_back(Err(GeminiError::ResponseParsing {
+                    context: "Parsing stream chunk".to_string(),
+                    source: e,
+                }.into()));
+                self.done = true;
+                return;
+            }
+        };
+        trace!(?chunk, "Received Gemini stream chunk");
+
+        if let Some(status) = chunk.error {
+            error!(code = status.code, message = %status.message, "Gemini reported an error mid-stream");
+            self.pending.push_back(Ok(StreamChunk::StreamError {
+                message: status.message,
+                code: Some(status.code.to_string()),
+            }));
+            self.done = true;
+            return;
+        }
+
+        // Usage metadata is cumulative; keep the latest
+        if let Some(usage) = chunk.usage_metadata {
+            self.usage = Some(usage.into());
+        }
+        let Some(candidate) = chunk.candidates.and_then(|c| c.into_iter().next()) else {
+            return;
+        };
+        if let Some(reason) = candidate.finish_reason {
+            self.finish_reason = Some(reason.into());
+        }
+        for part in candidate.content.map(|c| c.parts).unwrap_or_default() {
+            match part {
+                GeminiPart::Text { text } if !text.is_empty() => {
+                    self.pending.push_back(Ok(StreamChunk::Text(text)));
+                }
+                GeminiPart::FunctionCall { function_call } => {
+                    self.pending.push_back(Ok(StreamChunk::ToolCall(ToolCallRequest {
+                        id: format!("gemini-{}", Uuid::new_v4()),
+                        name: function_call.name,
+                        arguments: function_call.args,
+                    })));
+                }
+                GeminiPart::InlineData { inline_data } => {
+                    // Passed on still base64-encoded, as there is no dedicated chunk type
+                    self.pending.push_back(Ok(StreamChunk::ProviderSpecific {
+                        kind: "inline_data".to_string(),
+                        data: json!({ "mime_type": inline_data.mime_type, "data": inline_data.data }),
+                    }));
+                }
+                _ => trace!("Skipping empty text or function response part in Gemini stream chunk"),
+            }
+        }
+    }
 }
 
 
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn part(json: serde_json::Value) -> Result<GeminiPart, serde_json::Error> {
+        serde_json::from_value(json)
+    }
 
+    #[test]
+    fn decodes_each_part_kind() {
+        assert!(matches!(part(json!({ "text": "Hello" })).unwrap(),
+            GeminiPart::Text { text } if text == "Hello"));
 
+        // Responses use camelCase; snake_case is still accepted
+        for key in ["inlineData", "inline_data"] {
+            let decoded = part(json!({ key: { "mimeType": "image/png", "data": "aGk=" } })).unwrap();
+            assert!(matches!(decoded, GeminiPart::InlineData { inline_data }
+                if inline_data.mime_type == "image/png" && inline_data.data == "aGk="));
+        }
+
+        // Unknown fields next to and inside the payload are ignored
+        let decoded = part(json!({
+            "functionCall": { "name": "get_weather", "args": { "city": "Paris" }, "id": "call-1" },
+            "thoughtSignature": "c2lnbmF0dXJl"
+        })).unwrap();
+        assert!(matches!(decoded, GeminiPart::FunctionCall { function_call }
+            if function_call.name == "get_weather" && function_call.args == json!({ "city": "Paris" })));
+
+        let decoded = part(json!({
+            "functionResponse": { "name": "get_weather", "response": { "temperature": 21 } }
+        })).unwrap();
+        assert!(matches!(decoded, GeminiPart::FunctionResponse { function_response }
+            if function_response.name == "get_weather" && function_response.response == json!({ "temperature": 21 })));
+    }
+
+    #[test]
+    fn rejects_part_without_supported_payload() {
+        let err = part(json!({ "executableCode": { "language": "PYTHON", "code": "print(1)" } })).unwrap_err();
+        assert!(err.to_string().contains("unsupported content part"), "unexpected error {}", err);
+    }
+
+    async fn collect_stream(chunks: &[&'static str]) -> Vec<StreamChunk> {
+        // The chat stream is 'static, so it must own its input
+        let bytes = futures::stream::iter(chunks.to_vec().into_iter().map(|chunk| Ok::<_, reqwest::Error>(chunk.as_bytes())));
+        GeminiStreamState::new(bytes)
+            .into_chat_stream()
+            .map(|item| item.expect("Unexpected stream error"))
+            .collect()
+            .await
+    }
+
+    #[tokio::test]
+    async fn stream_emits_text_tool_calls_and_trailing_event() {
+        let chunks = collect_stream(&[
+            r#"data: {"candidates":[{"content":{"role":"model","parts":[{"text":"Hel"#,
+            "lo\"}]}}]}\r\n\r\n",
+            concat!(r#"data: {"candidates":[{"content":{"role":"model","parts":[{"functionCall":{"name":"get_weather","args":{"city":"Paris"}}}]}}]}"#, "\n\n"),
+            // Final event without a terminating blank line
+            r#"data: {"candidates":[{"content":{"role":"model","parts":[{"text":"!"}]},"finishReason":"STOP"}],"usageMetadata":{"promptTokenCount":3,"candidatesTokenCount":2,"totalTokenCount":5}}"#,
+        ]).await;
+
+        assert_eq!(chunks.len(), 4, "unexpected chunks {:?}", chunks);
+        assert_eq!(chunks[0], StreamChunk::Text("Hello".to_string()));
+        assert!(matches!(&chunks[1], StreamChunk::ToolCall(call)
+            if call.name == "get_weather" && call.arguments == json!({ "city": "Paris" })));
+        assert_eq!(chunks[2], StreamChunk::Text("!".to_string()));
+        assert!(matches!(&chunks[3], StreamChunk::StreamEnd { finish_reason: FinishReason::Stop, usage: Some(_) }));
+    }
+
+    #[tokio::test]
+    async fn stream_emits_inline_data() {
+        let chunks = collect_stream(&[
+            concat!(r#"data: {"candidates":[{"content":{"role":"model","parts":[{"inlineData":{"mimeType":"image/png","data":"aGk="}}]},"finishReason":"STOP"}]}"#, "\n\n"),
+        ]).await;
+
+        assert_eq!(chunks.len(), 2, "unexpected chunks {:?}", chunks);
+        assert_eq!(chunks[0], StreamChunk::ProviderSpecific {
+            kind: "inline_data".to_string(),
+            data: json!({ "mime_type": "image/png", "data": "aGk=" }),
+        });
+        assert!(matches!(&chunks[1], StreamChunk::StreamEnd { finish_reason: FinishReason::Stop, .. }));
+    }
+
+    #[tokio::test]
+    async fn stream_reports_error_event() {
+        let chunks = collect_stream(&[
+            concat!(r#"data: {"candidates":[{"content":{"role":"model","parts":[{"text":"Partial"}]}}]}"#, "\n\n"),
+            concat!(r#"data: {"error":{"code":500,"message":"Internal error","status":"INTERNAL"}}"#, "\n\n"),
+            concat!(r#"data: {"candidates":[{"content":{"role":"model","parts":[{"text":"ignored"}]}}]}"#, "\n\n"),
+        ]).await;
+
+        assert_eq!(chunks, vec![
+            StreamChunk::Text("Partial".to_string()),
+            StreamChunk::StreamError { message: "Internal error".to_string(), code: Some("500".to_string()) },
+        ]);
+    }
+
+    fn generate_request(messages: &[Message]) -> GeminiGenerateRequest {
+        let (system_instruction, contents) = GeminiChatClient::convert_messages(messages).unwrap();
+        GeminiGenerateRequest {
+            contents,
+            tools: None,
+            tool_config: None,
+            system_instruction,
+            generation_config: None,
+            cached_content: None,
+        }
+    }
+
+    #[tokio::test]
+    async fn reuses_context_cache_of_previous_turn() {
+        let client = GeminiChatClient::new("test-key").unwrap()
+            .with_context_caching(0, Duration::from_secs(300)).unwrap();
+        let cache = client.context_cache.as_ref().unwrap();
+        let turn_1 = vec![
+            Message::system("Be brief."),
+            Message::user("Hi"),
+            Message::assistant("Hello!"),
+            Message::user("What's the capital of France?"),
+        ];
+        let keys = generate_request(&turn_1).prefix_keys("test-model").unwrap();
+        assert_eq!(keys.len(), 2);
+        // As if the first turn had created a cache for its prefix
+        cache.insert(keys[1], "cachedContents/turn1".to_string());
+
+        let mut turn_2 = turn_1.clone();
+        turn_2.extend([Message::assistant("Paris."), Message::user("And Italy?")]);
+        let found = client.resolve_context_cache(cache, "test-model", &generate_request(&turn_2)).await;
+        // The cache covers the first two contents; the rest are sent with the request
+        assert_eq!(found, Some(("cachedContents/turn1".to_string(), 2)));
+    }
+
+    #[tokio::test]
+    async fn estimates_prompt_tokens() {
+        let client = GeminiChatClient::new("test-key").unwrap();
+        let messages = [Message::system("Be brief."), Message::user("The quick brown fox jumps over the lazy dog.")];
+        let count = client.estimate_tokens(&messages).await.unwrap();
+        assert!((10..=20).contains(&count), "unexpected token count {}", count);
+    }
+
+    #[test]
+    fn rejects_context_cache_ttl_within_expiry_margin() {
+        let client = GeminiChatClient::new("test-key").unwrap();
+        for ttl in [Duration::ZERO, Duration::from_millis(500), EXPIRY_MARGIN] {
+            assert!(matches!(client.clone().with_context_caching(0, ttl), Err(GeminiError::InvalidConfiguration(_))));
+        }
+        assert!(client.with_context_caching(0, EXPIRY_MARGIN + Duration::from_secs(1)).is_ok());
+    }
+
+    #[test]
+    fn prefix_keys_depend_on_model_and_system_instruction() {
+        let messages = vec![Message::user("Hi"), Message::assistant("Hello!"), Message::user("Bye")];
+        let request = generate_request(&messages);
+        let keys = request.prefix_keys("model-a").unwrap();
+        assert_ne!(keys, request.prefix_keys("model-b").unwrap());
+
+        let mut with_system = vec![Message::system("Be brief.")];
+        with_system.extend(messages);
+        assert_ne!(keys, generate_request(&with_system).prefix_keys("model-a").unwrap());
+    }
+
+    fn batch_operation(json: serde_json::Value) -> GeminiBatchOperation {
+        serde_json::from_value(json).expect("Failed to parse batch operation")
+    }
+
+    #[test]
+    fn parses_succeeded_batch_operation() {
+        let operation = batch_operation(json!({
+            "name": "batches/123",
+            "done": true,
+            "metadata": {
+                "@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch",
+                "model": "models/gemini-2.0-flash",
+                "state": "BATCH_STATE_SUCCEEDED"
+            },
+            "response": {
+                "@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatchOutput",
+                "inlinedResponses": {
+                    "inlinedResponses": [
+                        { "response": { "candidates": [{
+                            "content": { "role": "model", "parts": [{ "text": "Paris" }] },
+                            "finishReason": "STOP"
+                        }] } },
+                        { "error": { "code": 3, "message": "Invalid request" } }
+                    ]
+                }
+            }
+        }));
+        let GeminiBatchStatus::Completed(results) = operation.into_status("default").unwrap() else {
+            panic!("expected completed batch");
+        };
+        assert_eq!(results.len(), 2);
+        let response = results[0].as_ref().unwrap();
+        assert_eq!(response.content, vec![ContentPart::Text("Paris".to_string())]);
+        assert_eq!(response.model_id.as_deref(), Some("gemini-2.0-flash"));
+        assert!(matches!(&results[1], Err(ChatError::Api { message, .. }) if message.contains("Invalid request")));
+    }
+
+    #[test]
+    fn reports_failed_batch_operation() {
+        let failed = batch_operation(json!({
+            "name": "batches/123",
+            "done": true,
+            "metadata": { "state": "BATCH_STATE_FAILED" }
+        }));
+        assert!(matches!(failed.into_status("default"), Err(GeminiError::BatchJob(_))));
+
+        // An error counts even if the state is missing or unknown
+        let errored = batch_operation(json!({
+            "name": "batches/123",
+            "done": true,
+            "error": { "code": 13, "message": "Internal error" }
+        }));
+        assert!(matches!(errored.into_status("default"), Err(GeminiError::BatchJob(msg)) if msg.contains("Internal error")));
+
+        // Finished without results
+        let empty = batch_operation(json!({
+            "name": "batches/123",
+            "done": true,
+            "metadata": { "state": "SOME_NEW_STATE" }
+        }));
+        assert!(matches!(empty.into_status("default"), Err(GeminiError::BatchJob(_))));
+
+        let running = batch_operation(json!({
+            "name": "batches/123",
+            "metadata": { "state": "BATCH_STATE_RUNNING" }
+        }));
+        assert!(matches!(running.into_status("default"), Ok(GeminiBatchStatus::InProgress(GeminiBatchState::Running))));
+    }
+}
 
 // #[cfg(test)]
 // mod tests {
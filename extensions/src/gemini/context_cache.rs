@@ -0,0 +1,111 @@
+use std::collections::HashMap;
+use std::sync::Mutex;
+use std::time::{Duration, Instant};
+
+use tracing::trace;
+
+/// Entries are treated as expired slightly before the server-side TTL runs out,
+/// so a request never references a cache that disappears while in flight.
+pub(crate) const EXPIRY_MARGIN: Duration = Duration::from_secs(10);
+
+/// Process-local index of Gemini `cachedContents` resources, keyed by a hash of the
+/// conversation prefix they contain.
+#[derive(Debug)]
+pub(crate) struct ContextCache {
+    /// Estimated prefix size (in tokens) below which no cache is created.
+    min_prefix_tokens: usize,
+    /// Time-to-live requested for newly created caches.
+    ttl: Duration,
+    entries: Mutex<HashMap<u64, CachedPrefix>>,
+}
+
+#[derive(Debug)]
+struct CachedPrefix {
+    /// Resource name, e.g. "cachedContents/abc123".
+    name: String,
+    expires_at: Instant,
+}
+
+impl ContextCache {
+    pub(crate) fn new(min_prefix_tokens: usize, ttl: Duration) -> Self {
+        Self {
+            min_prefix_tokens,
+            ttl,
+            entries: Mutex::new(HashMap::new()),
+        }
+    }
+
+    pub(crate) fn min_prefix_tokens(&self) -> usize {
+        self.min_prefix_tokens
+    }
+
+    pub(crate) fn ttl(&self) -> Duration {
+        self.ttl
+    }
+
+    /// Returns the resource name cached for `key`, dropping the entry if it has expired.
+    pub(crate) fn lookup(&self, key: u64) -> Option<String> {
+        let mut entries = self.entries.lock().unwrap();
+        match entries.get(&key) {
+            Some(entry) if entry.expires_at > Instant::now() => Some(entry.name.clone()),
+            Some(_) => {
+                trace!(key, "Cached prefix expired");
+                entries.remove(&key);
+                None
+            }
+            None => None,
+        }
+    }
+
+    /// Finds the longest cached prefix among `keys`, where `keys[i]` identifies the prefix
+    /// of length `i + 1`. Returns the cache name and the length of the prefix it covers.
+    pub(crate) fn lookup_longest(&self, keys: &[u64]) -> Option<(String, usize)> {
+        keys.iter()
+            .enumerate()
+            .rev()
+            .find_map(|(i, key)| self.lookup(*key).map(|name| (name, i + 1)))
+    }
+
+    /// Records a newly created cache resource for `key`.
+    pub(crate) fn insert(&self, key: u64, name: String) {
+        let expires_at = Instant::now() + self.ttl.saturating_sub(EXPIRY_MARGIN);
+        let mut entries = self.entries.lock().unwrap();
+        // Opportunistically drop expired entries so the map does not grow without bound
+        let now = Instant::now();
+        entries.retain(|_, entry| entry.expires_at > now);
+        entries.insert(key, CachedPrefix { name, expires_at });
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn finds_longest_cached_prefix() {
+        let cache = ContextCache::new(0, Duration::from_secs(300));
+        cache.insert(1, "cachedContents/short".to_string());
+        cache.insert(3, "cachedContents/long".to_string());
+        assert_eq!(cache.lookup_longest(&[1, 2, 3, 4]), Some(("cachedContents/long".to_string(), 3)));
+        assert_eq!(cache.lookup_longest(&[1, 2]), Some(("cachedContents/short".to_string(), 1)));
+        assert_eq!(cache.lookup_longest(&[5, 6]), None);
+    }
+
+    #[test]
+    fn lookup_drops_expired_entries() {
+        let cache = ContextCache::new(0, Duration::from_secs(300));
+        cache.insert(1, "cachedContents/abc".to_string());
+        cache.entries.lock().unwrap().get_mut(&1).unwrap().expires_at = Instant::now();
+        assert_eq!(cache.lookup(1), None);
+        assert!(cache.entries.lock().unwrap().is_empty());
+    }
+
+    #[test]
+    fn ttl_within_expiry_margin_is_never_usable() {
+        for ttl in [Duration::ZERO, Duration::from_secs(5), EXPIRY_MARGIN] {
+            let cache = ContextCache::new(0, ttl);
+            cache.insert(1, "cachedContents/abc".to_string());
+            assert_eq!(cache.lookup(1), None, "entry with ttl {:?} was usable", ttl);
+        }
+    }
+}
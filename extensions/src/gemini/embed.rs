@@ -5,8 +5,7 @@ use markhor_core::embedding::{Embedder, Embedding, EmbeddingError, EmbeddingUseC
 use reqwest::Client;
 use serde::{Deserialize, Serialize};
 use tracing::{debug, error, instrument, trace, warn};
-use url::Url; // For logging/tracing
-use secrecy::ExposeSecret;
+use url::Url;
 
 use crate::gemini::error::map_response_error;
 
@@ -17,6 +16,7 @@ use super::{error::GeminiError, shared::{self, GeminiConfig, SharedGeminiClient,
 pub struct GeminiEmbedder {
     shared_client: Arc<SharedGeminiClient>,
     model_path_segment: String, // Path segment for API calls, e.g., "models/embedding-001"
+    batch_embed_url: Url, // Built once, reused for every request
     task_type: Option<String>,  // Store the configured task type string
 }
 
@@ -70,24 +70,17 @@ impl GeminiEmbedder {
             return Err(GeminiError::InvalidConfiguration("Model name cannot be empty".to_string()));
         }
         let model_path_segment = format!("models/{}", model_name);
+        let batch_embed_url = shared_client.build_url(&format!("{}:batchEmbedContents", model_path_segment))?;
 
-        // Map task_type string to EmbeddingUseCase enum
-        let use_case = map_task_type_to_use_case(task_type.as_deref());
-
-        debug!(model=%model_name, task_type=?task_type, use_case=?use_case, "GeminiEmbedder created.");
+        debug!(model=%model_name, task_type=?task_type, use_case=?map_task_type_to_use_case(task_type.as_deref()), "GeminiEmbedder created.");
 
         Ok(Self {
             shared_client,
             model_path_segment,
+            batch_embed_url,
             task_type,
         })
     }
-
-    // Helper to build the specific batchEmbedContents URL
-    fn build_batch_embed_url(&self) -> Result<Url, GeminiError> {
-        let path_segment = format!("{}:batchEmbedContents", self.model_path_segment);
-        self.shared_client.build_url(&path_segment) // No extra query besides API key
-    }    
 }
 
 /// Helper function to map Gemini task type strings to the EmbeddingUseCase enum.
@@ -134,7 +127,7 @@ impl Embedder for GeminiEmbedder {
             // but if the API returns a specific error for it, we could parse it in the error handling section.
 
             // 2. Build URL
-            let url = self.build_batch_embed_url()?; // Uses shared client internally
+            let url = self.batch_embed_url.clone();
             debug!(%url, "Sending batch embed request to Gemini");
 
             // 3. Construct Request Body
@@ -152,22 +145,21 @@ impl Embedder for GeminiEmbedder {
             let request_body = GeminiBatchRequest { requests };
 
             // 4. Serialize Request Body
-            let request_json = serde_json::to_string(&request_body)
+            let request_json = serde_json::to_vec(&request_body)
                 .map_err(|e| {
                     error!(error = %e, "Failed to serialize Gemini embed request body");
                     GeminiError::RequestSerialization(e)
                 })?;
-             trace!(body = %request_json, "Constructed Gemini embed request body JSON");
+             trace!(body = %String::from_utf8_lossy(&request_json), "Constructed Gemini embed request body JSON");
 
             // 5. Send Request (Add API Key Header - different from chat)
             // NOTE: The Gemini Embedding API documentation often shows using x-goog-api-key header.
             // Let's switch to using the header here, assuming the shared URL builder *doesn't* add the key.
             // We might need to adjust the shared URL builder or add a separate auth method.
-            // --- ASSUMPTION: build_batch_embed_url *does not* add the key= query param ---
+            // --- ASSUMPTION: batch_embed_url *does not* contain the key= query param ---
             // --- We'll add the header instead ---
-            let response = self.shared_client.http_client()
-                .post(url)
-                .header("x-goog-api-key", self.shared_client.config().api_key.expose_secret()) // API Key in header
+            let response = self.shared_client
+                .authorize(self.shared_client.http_client()?.post(url)) // API Key in header
                 .header("Content-Type", "application/json")
                 .body(request_json)
                 .send()
@@ -188,18 +180,18 @@ impl Embedder for GeminiEmbedder {
             // 8. Process Successful Response
             let status = response.status();
             debug!(%status, "Received successful response for embed request");
-            let raw_body = response.text()
+            let raw_body = response.bytes()
                 .await
                 .map_err(|e| {
                     error!(error = %e, "Failed to read successful response body for embed");
                     GeminiError::Network(e)
                 })?;
-            trace!(body = %raw_body, "Received Gemini embed response body");
+            trace!(body = %String::from_utf8_lossy(&raw_body), "Received Gemini embed response body");
 
             // 9. Parse JSON Response
-            let response_data: GeminiBatchResponse = serde_json::from_str(&raw_body)
+            let response_data: GeminiBatchResponse = serde_json::from_slice(&raw_body)
                 .map_err(|e| {
-                    error!(parse_error = %e, raw_body = %raw_body, "Failed to parse Gemini embed response JSON");
+                    error!(parse_error = %e, raw_body = %String::from_utf8_lossy(&raw_body), "Failed to parse Gemini embed response JSON");
                     GeminiError::ResponseParsing {
                         context: "Parsing batch embed response".to_string(),
                         source: e,
@@ -217,7 +209,7 @@ impl Embedder for GeminiEmbedder {
             }
 
             // 11. Convert to public Embedding struct
-            debug!("Successfully parsed Gemini embed response, received {} embeddings.", response_data.embeddings.len());
+            debug!(count = response_data.embeddings.len(), "Successfully parsed Gemini embed response");
             let embeddings_vec = response_data.embeddings
                 .into_iter()
                 .map(|e| Embedding::from(e.values)) // Assumes From<Vec<f32>> for Embedding exists
@@ -89,6 +89,10 @@ pub enum GeminiError {
         actual: usize, // Actual size required
     },
 
+    /// A batch job did not complete successfully (failed, cancelled or expired).
+    #[error("Batch job error: {0}")]
+    BatchJob(String),
+
     // Add other specific internal errors as needed
 }
 
@@ -231,6 +235,11 @@ impl From<GeminiError> for ChatError {
                 // Since Streaming variant expects a source, wrap the message.
                 ChatError::Streaming(msg.into())
             }
+            GeminiError::BatchJob(msg) => ChatError::Api {
+                status: None,
+                message: msg,
+                source: None,
+            },
             GeminiError::BatchTooLarge { .. } => {
                 // Batch size is not applicable to chat calls.
                 // Map to Provider error.
@@ -314,6 +323,7 @@ impl From<GeminiError> for EmbeddingError {
             GeminiError::BatchTooLarge { limit, actual } => {
                 EmbeddingError::BatchTooLarge { limit , actual }
             }
+            GeminiError::BatchJob(msg) => EmbeddingError::Provider(msg.into()),
         }
     }
 }
\ No newline at end of file
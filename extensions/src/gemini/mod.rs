@@ -3,20 +3,31 @@ use std::sync::Arc;
 use markhor_core::{chat::chat::ChatApi, embedding::Embedder, extension::Extension};
 
 mod chat;
+mod context_cache;
 mod embed;
+mod rate_limit;
+mod response_cache;
 mod shared;
+mod single_flight;
+mod sse;
+mod tokens;
 mod error;
 
 const EXTENSION_URI: &str = "https://github.com/dtrlanz/markhor/tree/main/extensions/src/gemini";
 
-pub use chat::GeminiChatClient;
+pub use chat::{GeminiBatchState, GeminiBatchStatus, GeminiChatClient};
 pub use embed::GeminiEmbedder;
 pub use error::GeminiError;
+pub use shared::GeminiConfig;
 use reqwest::Client;
-use shared::{GeminiConfig, SharedGeminiClient};
+use shared::SharedGeminiClient;
+use tracing::error;
 
 pub struct GeminiClientExtension {
     shared_client: Arc<SharedGeminiClient>,
+    // Built once; clones share the HTTP client and per-model endpoint caches
+    chat_client: GeminiChatClient,
+    embedder: GeminiEmbedder,
 }
 
 impl GeminiClientExtension {
@@ -33,11 +44,38 @@ impl GeminiClientExtension {
         if let Some(base_url_str) = api_base_url {
             config = config.base_url(&base_url_str)?;
         }
-        let shared_client = SharedGeminiClient::new(config, client_override)?;
+        Self::new_with_config(config, client_override)
+    }
+
+    /// Creates the extension from a full configuration (e.g., including rate limits).
+    pub fn new_with_config(
+        config: GeminiConfig,
+        client_override: Option<Client>,
+    ) -> Result<Self, GeminiError> {
+        let shared_client = Arc::new(SharedGeminiClient::new(config, client_override)?);
         Ok(GeminiClientExtension {
-            shared_client: Arc::new(shared_client),
+            chat_client: GeminiChatClient::new_with_shared_client(shared_client.clone(), None)?,
+            embedder: GeminiEmbedder::new_with_shared_client(
+                shared_client.clone(),
+                "text-embedding-004".into(),
+                None,
+            )?,
+            shared_client,
         })
     }
+
+    /// Builds the HTTP client (if not done yet) when a model is handed out, so that loading
+    /// TLS certificates happens here rather than inside the first request on the executor.
+    /// Returns `false` if the client cannot be built, in which case no model is provided.
+    fn init_http_client(&self) -> bool {
+        match self.shared_client.http_client() {
+            Ok(_) => true,
+            Err(e) => {
+                error!(error = %e, "Failed to initialize Gemini HTTP client");
+                false
+            }
+        }
+    }
 }
 
 impl Extension for GeminiClientExtension {
@@ -54,20 +92,11 @@ impl Extension for GeminiClientExtension {
     }
 
     fn chat_model(&self) -> Option<Box<dyn ChatApi>> {
-        let chat = GeminiChatClient::new_with_shared_client(
-            self.shared_client.clone(), 
-            None
-        ).ok()?;
-        Some(Box::new(chat))
+        self.init_http_client().then(|| Box::new(self.chat_client.clone()) as Box<dyn ChatApi>)
     }
 
     fn embedding_model(&self) -> Option<Box<dyn Embedder>> {
-        let embedder = GeminiEmbedder::new_with_shared_client(
-            self.shared_client.clone(), 
-            "text-embedding-004".into(),
-            None,
-        ).ok()?;
-        Some(Box::new(embedder))
+        self.init_http_client().then(|| Box::new(self.embedder.clone()) as Box<dyn Embedder>)
     }
 }
 
@@ -0,0 +1,107 @@
+use std::sync::Mutex;
+use std::time::{Duration, Instant};
+
+use tracing::debug;
+
+/// Client-side rate limiter enforcing requests-per-minute and tokens-per-minute quotas.
+///
+/// Callers reserve capacity before sending a request and wait until the reservation is
+/// covered. Reservations may overdraw the buckets, which queues later callers behind
+/// earlier ones instead of letting them race (and run into 429 responses).
+#[derive(Debug)]
+pub(crate) struct RateLimiter {
+    requests: Option<Mutex<TokenBucket>>,
+    tokens: Option<Mutex<TokenBucket>>,
+}
+
+impl RateLimiter {
+    /// Creates a limiter for the given quotas; `None` or 0 means unlimited.
+    pub(crate) fn new(requests_per_minute: Option<u32>, tokens_per_minute: Option<u32>) -> Self {
+        Self {
+            requests: requests_per_minute.filter(|&n| n > 0).map(|n| Mutex::new(TokenBucket::per_minute(n))),
+            tokens: tokens_per_minute.filter(|&n| n > 0).map(|n| Mutex::new(TokenBucket::per_minute(n))),
+        }
+    }
+
+    /// Waits until one request may be sent. `estimate_tokens` is only called if a
+    /// token limit is configured.
+    pub(crate) async fn acquire(&self, estimate_tokens: impl FnOnce() -> usize) {
+        let now = Instant::now();
+        let mut wait = Duration::ZERO;
+        if let Some(bucket) = &self.requests {
+            wait = wait.max(bucket.lock().unwrap().reserve(1.0, now));
+        }
+        if let Some(bucket) = &self.tokens {
+            let estimated_tokens = estimate_tokens();
+            wait = wait.max(bucket.lock().unwrap().reserve(estimated_tokens as f64, now));
+        }
+        if !wait.is_zero() {
+            debug!(wait_ms = wait.as_millis() as u64, "Rate limit reached, delaying Gemini request");
+            tokio::time::sleep(wait).await;
+        }
+    }
+}
+
+#[derive(Debug)]
+struct TokenBucket {
+    capacity: f64,
+    available: f64,
+    refill_per_sec: f64,
+    last_refill: Instant,
+}
+
+impl TokenBucket {
+    fn per_minute(limit: u32) -> Self {
+        debug_assert!(limit > 0, "a zero limit must not create a bucket");
+        let capacity = limit as f64;
+        Self {
+            capacity,
+            available: capacity,
+            refill_per_sec: capacity / 60.0,
+            last_refill: Instant::now(),
+        }
+    }
+
+    /// Takes `amount` from the bucket and returns how long the caller must wait for it.
+    fn reserve(&mut self, amount: f64, now: Instant) -> Duration {
+        let elapsed = now.saturating_duration_since(self.last_refill).as_secs_f64();
+        self.available = (self.available + elapsed * self.refill_per_sec).min(self.capacity);
+        self.last_refill = now;
+
+        // A single request larger than the bucket could never be covered; cap it
+        self.available -= amount.min(self.capacity);
+        if self.available >= 0.0 {
+            Duration::ZERO
+        } else {
+            Duration::from_secs_f64(-self.available / self.refill_per_sec)
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[tokio::test]
+    async fn zero_limits_are_unlimited() {
+        let limiter = RateLimiter::new(Some(0), Some(0));
+        assert!(limiter.requests.is_none());
+        assert!(limiter.tokens.is_none());
+        // Returns immediately without estimating tokens
+        limiter.acquire(|| unreachable!()).await;
+    }
+
+    #[test]
+    fn bucket_queues_requests_beyond_capacity() {
+        let start = Instant::now();
+        let mut bucket = TokenBucket::per_minute(60); // One per second
+        bucket.last_refill = start;
+        for _ in 0..60 {
+            assert_eq!(bucket.reserve(1.0, start), Duration::ZERO);
+        }
+        assert_eq!(bucket.reserve(1.0, start), Duration::from_secs(1));
+        assert_eq!(bucket.reserve(1.0, start), Duration::from_secs(2));
+        // Refilled after waiting
+        assert_eq!(bucket.reserve(1.0, start + Duration::from_secs(5)), Duration::ZERO);
+    }
+}
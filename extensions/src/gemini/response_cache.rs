@@ -0,0 +1,117 @@
+use std::collections::HashMap;
+use std::hash::{DefaultHasher, Hash, Hasher};
+use std::sync::Mutex;
+
+use markhor_core::chat::chat::{ChatOptions, ChatResponse, Message};
+use tracing::warn;
+
+/// Computes a key identifying a chat request by its model, messages and options.
+///
+/// Returns `None` if the request cannot be serialized, in which case it should simply
+/// not be cached.
+pub(crate) fn request_key(model_id: &str, messages: &[Message], options: &ChatOptions) -> Option<u64> {
+    match serde_json::to_vec(&(model_id, messages, options)) {
+        Ok(bytes) => {
+            let mut hasher = DefaultHasher::new();
+            bytes.hash(&mut hasher);
+            Some(hasher.finish())
+        }
+        Err(e) => {
+            warn!(error = %e, "Failed to serialize chat request for cache key");
+            None
+        }
+    }
+}
+
+/// Small in-memory LRU cache of chat responses for exact repeats of a request.
+#[derive(Debug)]
+pub(crate) struct ResponseCache {
+    capacity: usize,
+    inner: Mutex<LruEntries>,
+}
+
+#[derive(Debug, Default)]
+struct LruEntries {
+    /// Monotonic counter used to track recency.
+    tick: u64,
+    entries: HashMap<u64, (ChatResponse, u64)>,
+}
+
+impl ResponseCache {
+    pub(crate) fn new(capacity: usize) -> Self {
+        Self {
+            capacity,
+            inner: Mutex::new(LruEntries::default()),
+        }
+    }
+
+    /// Returns a copy of the cached response for `key`, marking it as recently used.
+    pub(crate) fn get(&self, key: u64) -> Option<ChatResponse> {
+        let mut inner = self.inner.lock().unwrap();
+        inner.tick += 1;
+        let tick = inner.tick;
+        inner.entries.get_mut(&key).map(|(response, last_used)| {
+            *last_used = tick;
+            response.clone()
+        })
+    }
+
+    /// Stores a response, evicting the least recently used entry if the cache is full.
+    pub(crate) fn insert(&self, key: u64, response: ChatResponse) {
+        if self.capacity == 0 {
+            return;
+        }
+        let mut inner = self.inner.lock().unwrap();
+        if inner.entries.len() >= self.capacity && !inner.entries.contains_key(&key) {
+            let oldest = inner.entries.iter()
+                .min_by_key(|(_, (_, last_used))| *last_used)
+                .map(|(key, _)| *key);
+            if let Some(oldest) = oldest {
+                inner.entries.remove(&oldest);
+            }
+        }
+        inner.tick += 1;
+        let tick = inner.tick;
+        inner.entries.insert(key, (response, tick));
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn response(text: &str) -> ChatResponse {
+        ChatResponse {
+            content: vec![markhor_core::chat::chat::ContentPart::Text(text.to_string())],
+            tool_calls: vec![],
+            usage: None,
+            finish_reason: None,
+            model_id: None,
+        }
+    }
+
+    #[test]
+    fn request_key_depends_on_all_inputs() {
+        let messages = vec![Message::user("Hello")];
+        let options = ChatOptions::default();
+        let key = request_key("model-a", &messages, &options);
+        assert!(key.is_some());
+        assert_eq!(key, request_key("model-a", &messages, &options));
+        assert_ne!(key, request_key("model-b", &messages, &options));
+        assert_ne!(key, request_key("model-a", &[Message::user("Hi")], &options));
+        let options = ChatOptions { temperature: Some(0.5), ..Default::default() };
+        assert_ne!(key, request_key("model-a", &messages, &options));
+    }
+
+    #[test]
+    fn evicts_least_recently_used() {
+        let cache = ResponseCache::new(2);
+        cache.insert(1, response("one"));
+        cache.insert(2, response("two"));
+        assert!(cache.get(1).is_some()); // 2 is now the least recently used
+        cache.insert(3, response("three"));
+        assert_eq!(cache.get(1), Some(response("one")));
+        assert_eq!(cache.get(2), None);
+        assert_eq!(cache.get(3), Some(response("three")));
+    }
+}
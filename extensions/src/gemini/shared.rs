@@ -1,10 +1,15 @@
-use reqwest::Client;
+use std::sync::Arc;
+
+use once_cell::sync::{Lazy, OnceCell};
+use reqwest::header::HeaderValue;
+use reqwest::{Client, RequestBuilder};
 use secrecy::{ExposeSecret, SecretString}; // Using `secrecy` for the API key
 use thiserror::Error;
 use tracing::{debug, instrument, trace};
 use url::Url; // Use the `url` crate for robust URL handling
 
 use super::error::GeminiError;
+use super::rate_limit::RateLimiter;
 
 // Re-use GeminiError definition from previous step
 // use crate::gemini::error::GeminiError;
@@ -13,6 +18,15 @@ use super::error::GeminiError;
 // Renaming the old default base URL constant for clarity
 const DEFAULT_GEMINI_GENERATIVE_LANGUAGE_BASE_URL: &str = "https://generativelanguage.googleapis.com";
 
+// Parsed once; every config starts from a copy of it.
+static DEFAULT_BASE_URL: Lazy<Url> = Lazy::new(|| {
+    Url::parse(DEFAULT_GEMINI_GENERATIVE_LANGUAGE_BASE_URL).expect("default Gemini base URL is valid")
+});
+
+// reqwest already pools connections without an idle cap; keepalive probes stop idle
+// pooled connections from being dropped silently by NATs and proxies.
+const TCP_KEEPALIVE: std::time::Duration = std::time::Duration::from_secs(60);
+
 pub(crate) const EXTENSION_URI: &str = "todo";
 
 /// Configuration for Gemini clients.
@@ -24,6 +38,10 @@ pub struct GeminiConfig {
     pub(crate) base_url: Url,
     /// Timeout for HTTP requests. Defaults to 60 seconds.
     pub(crate) timeout: std::time::Duration,
+    /// Client-side limit on requests per minute. Unlimited if `None`.
+    pub(crate) requests_per_minute: Option<u32>,
+    /// Client-side limit on (estimated) prompt tokens per minute. Unlimited if `None`.
+    pub(crate) tokens_per_minute: Option<u32>,
     // Add other shared configurations like retry policies if needed later
 }
 
@@ -34,23 +52,19 @@ impl GeminiConfig {
     /// * `api_key`: The Google AI API key.
     ///
     /// # Errors
-    /// Returns `GeminiError::InvalidConfiguration` if the API key is empty or the
-    /// default base URL fails to parse (which shouldn't happen).
+    /// Returns `GeminiError::InvalidConfiguration` if the API key is empty.
     pub fn new(api_key: impl Into<String>) -> Result<Self, GeminiError> {
         let api_key = api_key.into();
         if api_key.is_empty() {
             return Err(GeminiError::InvalidConfiguration("API key cannot be empty".to_string()));
         }
 
-        let base_url = Url::parse(DEFAULT_GEMINI_GENERATIVE_LANGUAGE_BASE_URL)
-            .map_err(|e| GeminiError::InvalidConfiguration(
-                format!("Internal error: Failed to parse default base URL: {}", e)
-            ))?; // This should ideally never fail
-
         Ok(Self {
             api_key: api_key.into(),
-            base_url,
+            base_url: DEFAULT_BASE_URL.clone(),
             timeout: std::time::Duration::from_secs(60),
+            requests_per_minute: None,
+            tokens_per_minute: None,
         })
     }
 
@@ -70,46 +84,100 @@ impl GeminiConfig {
         self.timeout = timeout;
         self
     }
+
+    /// Limits generate requests to `limit` per minute, queuing requests beyond it
+    /// instead of running into the API's rate limit. A `limit` of 0 removes the limit.
+    #[must_use]
+    pub fn requests_per_minute(mut self, limit: u32) -> Self {
+        self.requests_per_minute = (limit > 0).then_some(limit);
+        self
+    }
+
+    /// Limits generate requests to roughly `limit` prompt tokens per minute.
+    /// Token counts are approximated locally from the prompt length (without an API call).
+    /// A `limit` of 0 removes the limit.
+    #[must_use]
+    pub fn tokens_per_minute(mut self, limit: u32) -> Self {
+        self.tokens_per_minute = (limit > 0).then_some(limit);
+        self
+    }
 }
 
 /// Shared component holding the HTTP client and configuration for Gemini API access.
 #[derive(Clone, Debug)]
 pub(crate) struct SharedGeminiClient {
     config: GeminiConfig,
-    http_client: Client,
+    /// Built on first use: creating a client loads TLS root certificates, which would
+    /// otherwise slow down startup even if no request is ever made.
+    http_client: OnceCell<Client>,
+    /// Pre-validated `x-goog-api-key` header value, built once and reused for every request.
+    api_key_header: HeaderValue,
+    /// Shared by all clones, so chat clients created from one extension share the quota.
+    rate_limiter: Option<Arc<RateLimiter>>,
 }
 
 impl SharedGeminiClient {
     /// Creates a new SharedGeminiClient.
-    /// Builds a default reqwest client if one is not provided.
+    /// If no reqwest client is provided, a default one is built on first use.
     #[instrument(name = "shared_gemini_client_new", skip(config, client_override))]
     pub(crate) fn new(config: GeminiConfig, client_override: Option<Client>) -> Result<Self, GeminiError> {
-        let client = match client_override {
+        let http_client = match client_override {
             Some(client) => {
                 debug!("Using provided HTTP client.");
-                client
+                OnceCell::with_value(client)
             },
-            None => {
-                debug!(timeout=?config.timeout, "Building default HTTP client.");
-                Client::builder()
-                    .timeout(config.timeout)
-                    // Add other default client configurations (proxies, headers?) here if needed
-                    .build()
-                    .map_err(|e| GeminiError::InvalidConfiguration(
-                        format!("Failed to build default HTTP client: {}", e)
-                    ))?
-            }
+            None => OnceCell::new(),
         };
 
+        // Validate the API key as a header value once, instead of on every request
+        let mut api_key_header = HeaderValue::from_str(config.api_key.expose_secret())
+            .map_err(|e| GeminiError::InvalidConfiguration(
+                format!("API key is not a valid header value: {}", e)
+            ))?;
+        api_key_header.set_sensitive(true); // Keep the key out of debug output
+
         // Log base URL without API key
         debug!(base_url = %config.base_url, "Shared Gemini client initialized.");
 
-        Ok(Self { config, http_client: client })
+        let rate_limiter = (config.requests_per_minute.is_some() || config.tokens_per_minute.is_some())
+            .then(|| Arc::new(RateLimiter::new(config.requests_per_minute, config.tokens_per_minute)));
+
+        Ok(Self { config, http_client, api_key_header, rate_limiter })
+    }
+
+    /// Waits until the configured rate limits allow sending a request. `estimate_tokens`
+    /// is only evaluated if a token limit is configured. Returns immediately if no limits
+    /// are configured.
+    pub(crate) async fn throttle(&self, estimate_tokens: impl FnOnce() -> usize) {
+        if let Some(limiter) = &self.rate_limiter {
+            limiter.acquire(estimate_tokens).await;
+        }
+    }
+
+    /// Adds the API key header to a request.
+    pub(crate) fn authorize(&self, request: RequestBuilder) -> RequestBuilder {
+        request.header("x-goog-api-key", self.api_key_header.clone())
     }
 
-    /// Provides access to the underlying HTTP client.
-    pub(crate) fn http_client(&self) -> &Client {
-        &self.http_client
+    /// Provides access to the underlying HTTP client, building the default one if needed.
+    ///
+    /// Building loads TLS root certificates and blocks the calling thread. The extension
+    /// does this when a model is first handed out; clients constructed directly (e.g. via
+    /// `GeminiChatClient::new`) build it inside their first request instead, and if building
+    /// fails, every request retries it and reports the error.
+    pub(crate) fn http_client(&self) -> Result<&Client, GeminiError> {
+        self.http_client.get_or_try_init(|| {
+            debug!(timeout=?self.config.timeout, "Building default HTTP client.");
+            Client::builder()
+                .timeout(self.config.timeout)
+                // Detect dead pooled connections instead of failing the next request on them
+                .tcp_keepalive(TCP_KEEPALIVE)
+                // Add other default client configurations (proxies, headers?) here if needed
+                .build()
+                .map_err(|e| GeminiError::InvalidConfiguration(
+                    format!("Failed to build default HTTP client: {}", e)
+                ))
+        })
     }
 
     /// Provides access to the configuration.
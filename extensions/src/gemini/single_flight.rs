@@ -0,0 +1,100 @@
+use std::collections::HashMap;
+use std::sync::Mutex;
+
+use markhor_core::chat::chat::ChatResponse;
+use tokio::sync::broadcast;
+
+/// Tracks requests currently in flight, so that identical concurrent requests share a
+/// single API call.
+#[derive(Debug, Default)]
+pub(crate) struct InFlightRequests {
+    flights: Mutex<HashMap<u64, broadcast::Sender<Option<ChatResponse>>>>,
+}
+
+/// Role of a caller joining a request key.
+pub(crate) enum Flight<'a> {
+    /// No identical request is in flight; the caller sends it and reports the result.
+    Leader(FlightGuard<'a>),
+    /// An identical request is in flight. Receives its response, or `None` if it failed.
+    Follower(broadcast::Receiver<Option<ChatResponse>>),
+}
+
+impl InFlightRequests {
+    pub(crate) fn new() -> Self {
+        Self::default()
+    }
+
+    /// Joins the flight for `key`, becoming its leader if there is none yet.
+    pub(crate) fn join(&self, key: u64) -> Flight<'_> {
+        let mut flights = self.flights.lock().unwrap();
+        if let Some(sender) = flights.get(&key) {
+            return Flight::Follower(sender.subscribe());
+        }
+        let (sender, _) = broadcast::channel(1);
+        flights.insert(key, sender.clone());
+        Flight::Leader(FlightGuard { requests: self, key, sender, response: None })
+    }
+}
+
+/// Held by the leader of a flight. Followers are notified when it is dropped, which
+/// also happens if the leader fails or is cancelled.
+pub(crate) struct FlightGuard<'a> {
+    requests: &'a InFlightRequests,
+    key: u64,
+    sender: broadcast::Sender<Option<ChatResponse>>,
+    response: Option<ChatResponse>,
+}
+
+impl FlightGuard<'_> {
+    /// Shares the leader's response with all followers.
+    pub(crate) fn complete(mut self, response: ChatResponse) {
+        self.response = Some(response);
+    }
+}
+
+impl Drop for FlightGuard<'_> {
+    fn drop(&mut self) {
+        // Remove the entry first, so later requests start a new flight
+        self.requests.flights.lock().unwrap().remove(&self.key);
+        // Sending fails only if there are no followers
+        let _ = self.sender.send(self.response.take());
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use markhor_core::chat::chat::ContentPart;
+
+    fn response(text: &str) -> ChatResponse {
+        ChatResponse {
+            content: vec![ContentPart::Text(text.to_string())],
+            tool_calls: vec![],
+            usage: None,
+            finish_reason: None,
+            model_id: None,
+        }
+    }
+
+    #[tokio::test]
+    async fn followers_receive_leader_response() {
+        let requests = InFlightRequests::new();
+        let Flight::Leader(guard) = requests.join(1) else { panic!("expected leader") };
+        let Flight::Follower(mut receiver) = requests.join(1) else { panic!("expected follower") };
+        assert!(matches!(requests.join(2), Flight::Leader(_)));
+
+        guard.complete(response("shared"));
+        assert_eq!(receiver.recv().await.unwrap(), Some(response("shared")));
+        // The flight is over, so the next request leads a new one
+        assert!(matches!(requests.join(1), Flight::Leader(_)));
+    }
+
+    #[tokio::test]
+    async fn followers_are_notified_when_leader_fails() {
+        let requests = InFlightRequests::new();
+        let leader = requests.join(1);
+        let Flight::Follower(mut receiver) = requests.join(1) else { panic!("expected follower") };
+        drop(leader);
+        assert_eq!(receiver.recv().await.unwrap(), None);
+    }
+}
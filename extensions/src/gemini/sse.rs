@@ -0,0 +1,93 @@
+/// Incremental decoder splitting a Server-Sent Events byte stream into event payloads.
+///
+/// Works directly on bytes: each completed event's `data` is returned as a byte buffer
+/// that can be handed to `serde_json::from_slice` without an intermediate `String`.
+/// Only `data` fields are of interest; comments and other fields are ignored.
+#[derive(Debug, Default)]
+pub(crate) struct SseDecoder {
+    /// Received bytes not yet consumed as complete lines.
+    buffer: Vec<u8>,
+    /// Position in `buffer` up to which no line terminator was found.
+    scanned: usize,
+    /// Data of the event currently being assembled.
+    data: Vec<u8>,
+    has_data: bool,
+}
+
+impl SseDecoder {
+    pub(crate) fn new() -> Self {
+        Self::default()
+    }
+
+    /// Feeds a chunk of bytes, returning the data of all events it completes.
+    pub(crate) fn push(&mut self, chunk: &[u8]) -> Vec<Vec<u8>> {
+        self.buffer.extend_from_slice(chunk);
+        let mut events = Vec::new();
+        let mut consumed = 0;
+        while let Some(offset) = self.buffer[self.scanned..].iter().position(|&b| b == b'\n') {
+            let end = self.scanned + offset;
+            let mut line = &self.buffer[consumed..end];
+            if let [rest @ .., b'\r'] = line {
+                line = rest;
+            }
+            if line.is_empty() {
+                // Blank line terminates the event
+                if self.has_data {
+                    events.push(std::mem::take(&mut self.data));
+                    self.has_data = false;
+                }
+            } else if let Some(value) = line.strip_prefix(b"data:") {
+                let value = value.strip_prefix(b" ").unwrap_or(value);
+                if self.has_data {
+                    self.data.push(b'\n');
+                }
+                self.data.extend_from_slice(value);
+                self.has_data = true;
+            }
+            consumed = end + 1;
+            self.scanned = consumed;
+        }
+        self.buffer.drain(..consumed);
+        self.scanned = self.buffer.len();
+        events
+    }
+
+    /// Returns the data of a final event that was not terminated by a blank line.
+    pub(crate) fn finish(&mut self) -> Option<Vec<u8>> {
+        if !self.buffer.is_empty() {
+            // Treat the unterminated trailing line as complete
+            let mut events = self.push(b"\n");
+            if let Some(event) = events.pop() {
+                return Some(event);
+            }
+        }
+        if self.has_data {
+            self.has_data = false;
+            Some(std::mem::take(&mut self.data))
+        } else {
+            None
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn decodes_events_split_across_chunks() {
+        let mut decoder = SseDecoder::new();
+        assert!(decoder.push(b"data: {\"a\":").is_empty());
+        assert!(decoder.push(b"1}\r\n").is_empty());
+        let events = decoder.push(b"\r\ndata: {\"b\":2}\n\n: comment\n\n");
+        assert_eq!(events, vec![b"{\"a\":1}".to_vec(), b"{\"b\":2}".to_vec()]);
+        assert_eq!(decoder.finish(), None);
+    }
+
+    #[test]
+    fn joins_multiline_data_and_flushes_trailing_event() {
+        let mut decoder = SseDecoder::new();
+        assert!(decoder.push(b"data: first\ndata: second").is_empty());
+        assert_eq!(decoder.finish(), Some(b"first\nsecond".to_vec()));
+    }
+}
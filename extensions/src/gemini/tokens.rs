@@ -0,0 +1,60 @@
+use once_cell::sync::Lazy;
+use tiktoken_rs::CoreBPE;
+use tracing::warn;
+
+/// Tokens Gemini bills for a single (small) inline image.
+pub(crate) const IMAGE_TOKENS: usize = 258;
+
+/// Average number of UTF-8 bytes per token, for quick approximations.
+const BYTES_PER_TOKEN: usize = 4;
+
+/// Local BPE used to count tokens without calling the `countTokens` endpoint.
+///
+/// Gemini's own SentencePiece vocabulary is not available as a Rust crate; cl100k_base
+/// produces counts close enough for estimates. Loaded on first use, since building the
+/// vocabulary takes a noticeable amount of time.
+static BPE: Lazy<Option<CoreBPE>> = Lazy::new(|| match tiktoken_rs::cl100k_base() {
+    Ok(bpe) => Some(bpe),
+    Err(e) => {
+        warn!(error = %e, "Failed to load local tokenizer, falling back to length-based estimates");
+        None
+    }
+});
+
+/// Estimates the tokens in `text` with the local (cl100k_base) tokenizer.
+///
+/// CPU-bound (and slow on the first call), so it must not be used on the request path
+/// inside async code; see [`approximate_text_tokens`].
+pub(crate) fn estimate_text_tokens(text: &str) -> usize {
+    match BPE.as_ref() {
+        Some(bpe) => bpe.encode_ordinary(text).len(),
+        None => approximate_text_tokens(text),
+    }
+}
+
+/// Approximates the number of tokens in `text` from its length.
+///
+/// Constant time, for decisions made while sending a request (rate limiting, context
+/// caching), where tokenizing a long prompt would block the executor.
+pub(crate) fn approximate_text_tokens(text: &str) -> usize {
+    text.len().div_ceil(BYTES_PER_TOKEN)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn estimates_text_tokens() {
+        assert_eq!(estimate_text_tokens(""), 0);
+        let count = estimate_text_tokens("The quick brown fox jumps over the lazy dog.");
+        assert!((8..=14).contains(&count), "unexpected token count {}", count);
+    }
+
+    #[test]
+    fn approximates_text_tokens() {
+        assert_eq!(approximate_text_tokens(""), 0);
+        assert_eq!(approximate_text_tokens("abcd"), 1);
+        assert_eq!(approximate_text_tokens("abcde"), 2);
+    }
+}
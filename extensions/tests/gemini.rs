@@ -1,12 +1,13 @@
+use futures::StreamExt;
 use markhor_core::chat::chat::{
     ChatApi, ChatOptions, ContentPart, FinishReason,
-    Message, ToolChoice, ToolDefinition, ToolParameterSchema, ToolResult,
+    Message, StreamChunk, ToolChoice, ToolDefinition, ToolParameterSchema, ToolResult,
 };
 use markhor_core::embedding::{Embedder, EmbeddingUseCase, EmbeddingError};
 use serde_json::json;
 use tracing::error;
 
-use markhor_extensions::gemini::{GeminiChatClient, GeminiEmbedder};
+use markhor_extensions::gemini::{GeminiBatchStatus, GeminiChatClient, GeminiEmbedder};
 
 
 
@@ -97,6 +98,97 @@ async fn test_gemini_generate_simple_integration() {
 }
 
 
+#[tokio::test]
+#[ignore]
+async fn test_gemini_generate_stream_integration() {
+    setup_tracing();
+    let client = get_chat_client().await;
+    let messages = vec![
+        Message::user("Count from 1 to 10, separated by spaces."),
+    ];
+    let options = ChatOptions {
+        model_id: Some("gemini-1.5-flash-latest".to_string()),
+        max_tokens: Some(100),
+        ..Default::default()
+    };
+
+    let mut stream = client.generate_stream(&messages, &options).await
+        .expect("generate_stream failed");
+
+    let mut text = String::new();
+    let mut end = None;
+    while let Some(chunk) = stream.next().await {
+        match chunk.expect("Stream item failed") {
+            StreamChunk::Text(delta) => text.push_str(&delta),
+            StreamChunk::StreamEnd { finish_reason, usage } => end = Some((finish_reason, usage)),
+            other => info!(chunk = ?other, "Other stream chunk"),
+        }
+    }
+    info!(%text, "Streamed text");
+
+    assert!(text.contains("10"));
+    let (finish_reason, usage) = end.expect("Stream ended without StreamEnd chunk");
+    assert_eq!(finish_reason, FinishReason::Stop);
+    assert!(usage.is_some());
+}
+
+#[tokio::test]
+#[ignore]
+async fn test_gemini_generate_batch_integration() {
+    setup_tracing();
+    let client = get_chat_client().await;
+    let options = ChatOptions {
+        model_id: Some("gemini-1.5-flash-latest".to_string()),
+        max_tokens: Some(20),
+        ..Default::default()
+    };
+    let requests = vec![
+        (vec![Message::user("What's the capital of France? Answer in one word.")], options.clone()),
+        (vec![Message::user("What's the capital of Italy? Answer in one word.")], options.clone()),
+        (vec![Message::user("What's the capital of Spain? Answer in one word.")], options),
+    ];
+
+    let results = client.generate_batch(&requests, Some(2)).await;
+
+    // Results come back in request order
+    assert_eq!(results.len(), requests.len());
+    for (result, expected) in results.iter().zip(["paris", "rome", "madrid"]) {
+        let response = result.as_ref().expect("Batch item failed");
+        let text = match &response.content[0] {
+            ContentPart::Text(t) => t,
+            _ => panic!("Expected text response"),
+        };
+        assert!(text.to_lowercase().contains(expected), "Expected '{}' in '{}'", expected, text);
+    }
+}
+
+#[tokio::test]
+#[ignore]
+async fn test_gemini_submit_and_poll_batch_integration() {
+    setup_tracing();
+    let client = get_chat_client().await;
+    let options = ChatOptions {
+        model_id: Some("gemini-2.0-flash".to_string()),
+        max_tokens: Some(20),
+        ..Default::default()
+    };
+    let requests = vec![
+        (vec![Message::user("What's the capital of France? Answer in one word.")], options.clone()),
+        (vec![Message::user("What's the capital of Italy? Answer in one word.")], options),
+    ];
+
+    let batch_name = client.submit_batch(&requests).await.expect("Failed to submit batch");
+    assert!(batch_name.starts_with("batches/"), "Unexpected batch name '{}'", batch_name);
+
+    // Batch jobs usually take minutes, so only check that the job can be polled
+    let status = client.poll_batch(&batch_name).await.expect("Failed to poll batch");
+    match status {
+        GeminiBatchStatus::InProgress(state) => info!(?state, "Batch job in progress"),
+        GeminiBatchStatus::Completed(results) => assert_eq!(results.len(), requests.len()),
+    }
+}
+
+
 #[tokio::test]
 #[ignore]
 async fn test_gemini_generate_tool_use_integration() {
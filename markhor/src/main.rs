@@ -1,3 +1,4 @@
+use std::num::NonZeroU32;
 use std::path::PathBuf;
 use std::pin::Pin;
 use std::future::Future;
@@ -13,10 +14,10 @@ use markhor_core::extension::{ActiveExtension, Extension};
 use markhor_core::storage::{Storage, Workspace};
 use markhor_extensions::chunking::Chunkers;
 use markhor_extensions::cli::CliExtension;
-use markhor_extensions::gemini::GeminiClientExtension;
+use markhor_extensions::gemini::{GeminiClientExtension, GeminiConfig, GeminiError};
 use markhor_extensions::ocr::mistral::client::MistralClient;
 use reqwest::Client;
-use tracing::{debug, error, info, Level};
+use tracing::{debug, error, info, warn, Level};
 use tracing_subscriber::EnvFilter;
 
 
@@ -45,7 +46,7 @@ async fn main() -> Result<()> {
     match std::env::var("GOOGLE_API_KEY") {
         Ok(key) => {
             info!("Google API key loaded from environment variables");
-            match GeminiClientExtension::new(key) {
+            match gemini_config(key).and_then(|config| GeminiClientExtension::new_with_config(config, None)) {
                 Ok(ext) => extensions.push(ActiveExtension::new(ext, Default::default())),
                 Err(e) => {
                     error!("Failed to construct Gemini extension: {}", e);
@@ -157,6 +158,32 @@ async fn main() -> Result<()> {
     Ok(())
 }
 
+/// Builds the Gemini configuration, applying optional client-side rate limits
+/// from the `GEMINI_RPM` and `GEMINI_TPM` environment variables.
+fn gemini_config(api_key: String) -> Result<GeminiConfig, GeminiError> {
+    let mut config = GeminiConfig::new(api_key)?;
+    if let Some(rpm) = env_limit("GEMINI_RPM") {
+        config = config.requests_per_minute(rpm);
+    }
+    if let Some(tpm) = env_limit("GEMINI_TPM") {
+        config = config.tokens_per_minute(tpm);
+    }
+    Ok(config)
+}
+
+/// Reads a positive limit from an environment variable, warning if it is set but invalid
+/// (including 0, which would otherwise look like an active limit).
+fn env_limit(name: &str) -> Option<u32> {
+    let value = std::env::var(name).ok()?;
+    match value.trim().parse::<NonZeroU32>() {
+        Ok(limit) => Some(limit.get()),
+        Err(e) => {
+            warn!(variable = name, %value, error = %e, "Ignoring invalid rate limit; expected a positive whole number");
+            None
+        }
+    }
+}
+
 /// Sets up the tracing subscriber.
 /// Respects RUST_LOG environment variable first, then falls back
 /// to verbosity flags (-v, -q).